@@ -0,0 +1,105 @@
+from typing import List, Tuple
+import numpy as np
+from csr_graph import CSRGraph
+import dijkstra as dij
+import instrumentation as ins
+import route_history as rh
+
+
+'''Takes timestamps in form of '28 Mr 00_09_47' and the 24 hourly percentage lists; returns a (timestamps x 1308)
+matrix whose rows are the edge weights dijkstra_1 would use for each timestamp'''
+
+
+def weight_matrix(timestamps, perc):
+    matrix = np.empty((len(timestamps), len(perc[0])))
+    for row, time in enumerate(timestamps):
+        ind = rh.hour_of(time)
+        matrix[row] = dij.edge_weights(time, perc[ind])
+    return matrix
+
+
+'''Label-correcting (Bellman-Ford) relaxation for many weight vectors at once; weights holds one row of edge weights
+(indexed by edge number) per timestamp. Every round only relaxes the edges leaving vertices that improved in the
+previous round. Returns the distances (timestamps x vertices, inf where unreachable) and the CSR position of the
+edge used to reach every vertex (-1 for the source and unreachable vertices)'''
+
+
+def batched_shortest_paths(g: CSRGraph, weights: np.ndarray, source: int) -> Tuple[np.ndarray, np.ndarray]:
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+
+    # sort the edges by head vertex, so one reduceat finds the best incoming edge of every vertex;
+    # the working arrays are vertex/edge major, so gathering a vertex copies one contiguous row of timestamps
+    order = np.argsort(np.asarray(g.targets), kind='stable')
+    heads = np.asarray(g.targets)[order]
+    tails = np.asarray(g.tails)[order]
+    costs = np.ascontiguousarray(weights[:, np.asarray(g.edge_numbers)[order]].T)
+
+    distances = np.full((g.vertex_count, len(weights)), np.inf)
+    distances[source] = 0
+    via = np.full((g.vertex_count, len(weights)), -1)
+    changed = np.zeros(g.vertex_count, dtype=bool)
+    changed[source] = True
+
+    while True:
+        active = np.flatnonzero(changed[tails])
+        if len(active) == 0:
+            break  # every timestamp has converged
+        active_heads = heads[active]
+        starts = np.flatnonzero(np.r_[True, active_heads[1:] != active_heads[:-1]])
+        segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(active)]))
+        head_vertices = active_heads[starts]
+
+        candidates = distances[tails[active]] + costs[active]
+        best = np.minimum.reduceat(candidates, starts, axis=0)
+        current = distances[head_vertices]
+        improved = best < current
+        edges, columns = np.nonzero((candidates == best[segment]) & improved[segment])
+        via[active_heads[edges], columns] = order[active[edges]]
+        distances[head_vertices] = np.where(improved, best, current)
+
+        changed[:] = False
+        changed[head_vertices[improved.any(axis=1)]] = True
+
+    return distances.T, via.T
+
+
+'''Takes the edge positions from batched_shortest_paths; returns the vertex indices of the path from source to target
+for every row, an empty list where the target is unreachable'''
+
+
+def batched_paths(g: CSRGraph, via: np.ndarray, source: int, target: int) -> List[List[int]]:
+    tails = g.tails
+    paths = []
+    for row in via.tolist():
+        if target != source and row[target] < 0:
+            paths.append([])
+            continue
+        path = [target]
+        while path[-1] != source:
+            path.append(tails[row[path[-1]]])
+        paths.append(list(reversed(path)))
+    return paths
+
+
+'''Takes timestamps and the 24 hourly percentage lists; returns the route from source to target (as a list of vertex
+names like print_weighted_path shows it) and its weight for every timestamp, computed in chunks of chunk_size on
+graph (default: dij.city_graph()); with dij.use_landmarks set the routes come from landmarks.shortest_routes'''
+
+
+def shortest_routes(timestamps, perc, source="94", target="162", chunk_size=512, graph=None):
+    if dij.use_landmarks:
+        import landmarks as lm
+        return lm.shortest_routes(timestamps, perc, source, target, graph)
+    g: CSRGraph[str] = dij.city_graph() if graph is None else graph
+    first = g.index_of(source)
+    last = g.index_of(target)
+    routes = []
+    weights = []
+    for start in range(0, len(timestamps), chunk_size):
+        with ins.stage('edge_weights'):
+            matrix = weight_matrix(timestamps[start:start + chunk_size], perc)
+        with ins.stage('batch_search'):
+            distances, via = batched_shortest_paths(g, matrix, first)
+        routes += [[g.vertex_at(v) for v in path] for path in batched_paths(g, via, first, last)]
+        weights += distances[:, last].tolist()
+    return routes, weights
@@ -0,0 +1,200 @@
+import ast
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import dijkstra as dij
+import duration_cache as dc
+import edge_frequency as ef
+import edge_index as ei
+import find_routes as fr
+import instrumentation as ins
+import mst
+import route_history as rh
+import similarity as sim
+import snapshot as sn
+import validate_dijkstra_hourly_cluster as vhc
+
+REFERENCE = 'validate_d.txt'
+DURATION_TOLERANCE = 0.005  # get_route_duration rounds to two digits
+SIMILARITY_TOLERANCE = 1e-9
+
+
+'''Reads the dijkstra_1 dumps of validate_d.txt; returns {timestamp: (route, duration, similarity)} with the route as
+vertex names, the printed total duration and the similarity printed after it (last entry of the growing list)'''
+
+
+def read_reference(path=REFERENCE):
+    reference = {}
+    with open(path) as f:
+        lines = [line.strip() for line in f if line.strip()]
+    for i, line in enumerate(lines):
+        if line.startswith('Shortest path from'):
+            timestamp = line.split(' at ', 1)[1].rstrip(':')
+            route = ast.literal_eval(lines[i + 1].split(':', 1)[1].strip())
+            duration = float(lines[i + 2].split(':', 1)[1])
+            similarity = ast.literal_eval(lines[i + 3])[-1] if lines[i + 3].startswith('[') else None
+            reference[timestamp] = (route, duration, similarity)
+    return reference
+
+
+# Drop what the modules keep in memory, so every repetition pays for loading the graph, the snapshot and the
+# predicted durations again; the files on disk (city.snap, edge_frequency.npz, *.csv.bin) stay
+def reset_caches():
+    dij._city_graph = None
+    dij._city_graph_reversed = None
+    sn._snapshot = None
+    ei._city_edge_index = None
+    ef._hourly = None
+    sim._hourly.clear()
+    dc.cache.clear()
+
+
+def hourly_percentages(timestamp):
+    return ef.hourly_counts().percentages(rh.hour_of(timestamp))
+
+
+def check_route(timestamp, route, reference, mismatches):
+    expected_route, expected_duration, _ = reference[timestamp]
+    if list(route) != expected_route:
+        mismatches.append(f"{timestamp}: route differs from {REFERENCE}")
+    duration = mst.get_route_duration(route, timestamp)
+    if abs(duration - expected_duration) > DURATION_TOLERANCE:
+        mismatches.append(f"{timestamp}: duration {duration} instead of {expected_duration}")
+
+
+# Every workload returns (queries, vertices settled or None, mismatches); the time of prepare() is not counted
+
+def single_dijkstra(reference):
+    timestamp = next(iter(reference))
+
+    def prepare():
+        g = dij.city_graph()
+        g.update_weights(dij.edge_weights(timestamp, hourly_percentages(timestamp)))
+        return g
+
+    def run(g):
+        stats = dij.SearchStats()
+        distances, path_dict = dij.dijkstra(g, "94", stats)
+        path = dij.path_dict_to_path(g.index_of("94"), g.index_of("162"), path_dict)
+        mismatches = []
+        check_route(timestamp, [g.vertex_at(e.u) for e in path] + ["162"], reference, mismatches)
+        return 1, stats.pops, mismatches
+
+    return prepare, run
+
+
+def full_dijkstra_1(reference):
+    timestamp = next(iter(reference))
+
+    def prepare():
+        reset_caches()
+        return hourly_percentages(timestamp)  # the percentages are an input of dijkstra_1, not part of it
+
+    def run(per):
+        stats = dij.SearchStats()
+        printed = []  # the arguments of every ins.emit call, the route among them
+        output, ins.output = ins.output, lambda *args: printed.append(args)
+        try:
+            duration = dij.dijkstra_1(timestamp, per, stats)
+        finally:
+            ins.output = output
+        mismatches = []
+        routes = [args[1] for args in printed if len(args) > 1 and args[0] == "Route: "]
+        if routes:
+            check_route(timestamp, routes[-1], reference, mismatches)
+        else:
+            mismatches.append(f"{timestamp}: dijkstra_1 printed no route")
+        expected = reference[timestamp][1]
+        if abs(duration - expected) > DURATION_TOLERANCE:
+            mismatches.append(f"{timestamp}: returned duration {duration} instead of {expected}")
+        return 1, stats.pops, mismatches
+
+    return prepare, run
+
+
+def one_day(reference):
+    def run(_):
+        routes = fr.compute_all_routes()
+        timestamps = fr.ts.get_timestamp_all()[4267:]
+        mismatches = []
+        for timestamp, route in zip(timestamps, routes):
+            if timestamp in reference:
+                check_route(timestamp, route, reference, mismatches)
+        return len(routes), None, mismatches
+
+    return reset_caches, run
+
+
+# Scores the route validate_d.txt recorded for every timestamp, so the similarity stage is checked on its own,
+# independent of the predicted durations the routes come from
+def reference_similarity(reference):
+    def run(_):
+        mismatches = []
+        for timestamp, (route, _, expected) in reference.items():
+            value = vhc.similar(route, timestamp)
+            if expected is not None and abs(value - expected) > SIMILARITY_TOLERANCE:
+                mismatches.append(f"{timestamp}: similarity {value} instead of {expected}")
+        return len(reference), None, mismatches
+
+    return reset_caches, run
+
+
+def similarity_history(reference):
+    def run(_):
+        values = vhc.get_seventy_five_percent_similarity_percent()
+        timestamps = vhc.ts.get_timestamp_all()
+        mismatches = []
+        for timestamp, value in zip(timestamps, values):
+            expected = reference.get(timestamp, (None, None, None))[2]
+            if expected is not None and abs(value - expected) > SIMILARITY_TOLERANCE:
+                mismatches.append(f"{timestamp}: similarity {value} instead of {expected}")
+        return len(values), None, mismatches
+
+    return reset_caches, run
+
+
+WORKLOADS = {'dijkstra': single_dijkstra, 'dijkstra_1': full_dijkstra_1, 'one_day': one_day,
+             'similarity': reference_similarity, 'hourly_cluster': similarity_history}
+
+
+'''Runs every workload repeat times for the wall time and once more under tracemalloc for the peak of memory
+allocated; checks each run against validate_d.txt and writes the results as JSON to output. Returns the results'''
+
+
+def run_benchmarks(names=None, repeat=3, output='benchmark.json', reference_path=REFERENCE):
+    reference = read_reference(reference_path)
+    results = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+               'reference': reference_path, 'workloads': {}}
+    for name in names or WORKLOADS:
+        prepare, run = WORKLOADS[name](reference)
+        seconds = []
+        for _ in range(repeat):
+            state = prepare()
+            start = time.perf_counter()
+            queries, settled, mismatches = run(state)
+            seconds.append(time.perf_counter() - start)
+
+        state = prepare()
+        tracemalloc.start()
+        run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results['workloads'][name] = {
+            'seconds': seconds, 'best_seconds': min(seconds), 'peak_bytes': peak, 'queries': queries,
+            'settled_per_query': None if settled is None else settled / queries,
+            'mismatches': len(mismatches), 'first_mismatches': mismatches[:10]}
+        print("{:12} best {:9.4f} s  peak {:8.1f} MB  mismatches {}".format(name, min(seconds), peak / 2 ** 20,
+                                                                          len(mismatches)))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    return results
+
+
+if __name__ == '__main__':
+    chosen = [arg for arg in sys.argv[1:] if arg in WORKLOADS] or None
+    outcome = run_benchmarks(chosen)
+    sys.exit(1 if any(w['mismatches'] for w in outcome['workloads'].values()) else 0)
@@ -0,0 +1,42 @@
+import time
+import dijkstra as dij
+import snapshot as sn
+import geo
+import route_history as rh
+
+'''Runs plain dijkstra(), dijkstra() with early exit and astar() from 94 to 162 for every timestamp of the last day;
+returns the vertices settled and seconds spent by each variant, and prints a summary'''
+
+
+def compare_settled_vertices(timestamps=None):
+    if timestamps is None:
+        timestamps = rh.get_last_day_timestamps()
+    g = dij.city_graph()
+    snapshot = sn.city_snapshot()
+    coordinates = snapshot.vertex_coordinates()
+    lengths = geo.edge_lengths(g, coordinates)
+    stats = {'dijkstra': dij.SearchStats(), 'dijkstra target': dij.SearchStats(), 'astar': dij.SearchStats()}
+    seconds = dict.fromkeys(stats, 0.0)
+
+    for timestamp in timestamps:
+        ind = rh.hour_of(timestamp)
+        g.update_weights(dij.edge_weights(timestamp, snapshot.hour_percentages(ind)))
+        runs = {'dijkstra': lambda: dij.dijkstra(g, "94", stats['dijkstra']),
+                'dijkstra target': lambda: dij.dijkstra(g, "94", stats['dijkstra target'], target="162"),
+                'astar': lambda: dij.astar(g, "94", "162", coordinates, lengths, stats['astar'])}
+        distances = {}
+        for name, run in runs.items():
+            start = time.perf_counter()
+            distances[name] = run()[0][g.index_of("162")]
+            seconds[name] += time.perf_counter() - start
+        if abs(distances['astar'] - distances['dijkstra']) > 1e-9:
+            raise AssertionError(f"astar found {distances['astar']} instead of {distances['dijkstra']} at {timestamp}")
+
+    for name in stats:
+        print("{:16} settled per query: {:7.1f}  ms per query: {:.3f}".format(
+            name, stats[name].pops / len(timestamps), 1000 * seconds[name] / len(timestamps)))
+    return stats, seconds
+
+
+if __name__ == '__main__':
+    compare_settled_vertices()
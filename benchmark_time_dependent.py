@@ -0,0 +1,50 @@
+import time
+import dijkstra as dij
+import duration_cache as dc
+import route_history as rh
+import time_dependent as td
+
+'''For every timestamp of the last day, finds the 94 -> 162 route once with static durations taken at departure (as
+dijkstra_1 weights the edges, without the percentages) and once time dependent; both routes are then driven with the
+durations at the time each edge is reached. Returns the travel times of both and prints a summary'''
+
+
+def compare_static(timestamps=None):
+    if timestamps is None:
+        timestamps = rh.get_last_day_timestamps()
+    table = td.city_duration_table()
+    g = dij.city_graph()
+    first, last = g.index_of("94"), g.index_of("162")
+    static_times, dynamic_times = [], []
+    seconds = {'static': 0.0, 'time dependent': 0.0}
+    changed = 0
+
+    for timestamp in timestamps:
+        departure = td.minutes(timestamp)
+        start = time.perf_counter()
+        g.update_weights(dc.get_edges_predicted_duration(timestamp))
+        path_dict = dij.dijkstra_csr(g, "94", target="162")[1]
+        static_route = [e.u for e in dij.path_dict_to_path(first, last, path_dict)] + [last]
+        seconds['static'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        arrivals, path_dict = td.td_dijkstra(g, table, "94", departure, target="162")
+        dynamic_route = [e.u for e in dij.path_dict_to_path(first, last, path_dict)] + [last]
+        seconds['time dependent'] += time.perf_counter() - start
+
+        static_times.append(td.travel_time(g, table, static_route, departure))
+        dynamic_times.append(arrivals[last] - departure)
+        if dynamic_times[-1] > static_times[-1] + 1e-9:
+            raise AssertionError(f"time dependent route slower than the static one at {timestamp}")
+        changed += static_route != dynamic_route
+
+    saved = [s - d for s, d in zip(static_times, dynamic_times)]
+    print("routes that differ: {} of {}".format(changed, len(timestamps)))
+    print("minutes saved per trip: mean {:.3f}  max {:.3f}".format(sum(saved) / len(saved), max(saved)))
+    for name in seconds:
+        print("{:16} ms per query: {:.3f}".format(name, 1000 * seconds[name] / len(timestamps)))
+    return static_times, dynamic_times
+
+
+if __name__ == '__main__':
+    compare_static()
@@ -0,0 +1,304 @@
+from __future__ import annotations
+import os
+from heapq import heappush, heappop
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import dijkstra as dij
+import instrumentation as ins
+import route_history as rh
+import snapshot as sn
+from mst import WeightedPath, print_weighted_path
+from weighted_edge import WeightedEdge
+
+
+class ContractionHierarchy:
+    '''Metric independent part of a customizable contraction hierarchy over the edges tails[i] -> heads[i]. Vertices
+    are contracted in a minimum degree order (rank[v] is the position of v in it), ignoring edge directions; contracting
+    a vertex joins its higher ranked neighbours, so the arcs are the edges of the resulting chordal graph. Arc a joins
+    arc_lower[a] to the higher ranked arc_heads[a]; the arcs of every vertex to its higher neighbours are
+    arc_offsets[v] .. arc_offsets[v + 1] - 1. Every lower triangle u < w < x is stored once: tri_target is arc w-x,
+    tri_first arc u-w and tri_second arc u-x, sorted by the elimination tree level of w (levels start at
+    level_offsets), so arcs of one level only depend on arcs of lower levels'''
+
+    def __init__(self, tails: np.ndarray, heads: np.ndarray, rank: np.ndarray, arc_offsets: np.ndarray,
+                 arc_heads: np.ndarray, parent: np.ndarray, edge_arc: np.ndarray, edge_upward: np.ndarray,
+                 tri_target: np.ndarray, tri_first: np.ndarray, tri_second: np.ndarray,
+                 level_offsets: np.ndarray) -> None:
+        self.tails: np.ndarray = tails
+        self.heads: np.ndarray = heads
+        self.rank: np.ndarray = rank
+        self.arc_offsets: np.ndarray = arc_offsets
+        self.arc_heads: np.ndarray = arc_heads
+        self.arc_lower: np.ndarray = np.repeat(np.arange(len(rank), dtype=np.int32), np.diff(arc_offsets))
+        self.parent: np.ndarray = parent  # elimination tree: lowest ranked higher neighbour, -1 for roots
+        self.edge_arc: np.ndarray = edge_arc  # arc of every edge number, -1 for loops
+        self.edge_upward: np.ndarray = edge_upward  # True if the edge runs from the lower to the higher vertex
+        self.tri_target: np.ndarray = tri_target
+        self.tri_first: np.ndarray = tri_first
+        self.tri_second: np.ndarray = tri_second
+        self.level_offsets: np.ndarray = level_offsets
+        # plain lists for the queries, which walk single vertices
+        self._offsets: List[int] = arc_offsets.tolist()
+        self._heads: List[int] = arc_heads.tolist()
+        self._lower: List[int] = self.arc_lower.tolist()
+        self._parent: List[int] = parent.tolist()
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self.rank)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.tails)
+
+    @property
+    def arc_count(self) -> int:
+        return len(self.arc_heads)
+
+    # Order and contract the graph; only the topology is used, so this runs once for any number of weight vectors
+    @classmethod
+    def build(cls, tails: Sequence[int], heads: Sequence[int], vertex_count: int) -> ContractionHierarchy:
+        tails = np.asarray(tails, dtype=np.int32)
+        heads = np.asarray(heads, dtype=np.int32)
+        neighbours: List[set] = [set() for _ in range(vertex_count)]
+        for u, v in zip(tails.tolist(), heads.tolist()):
+            if u != v:
+                neighbours[u].add(v)
+                neighbours[v].add(u)
+
+        # minimum degree elimination with a lazy heap; the fill-in it creates are the shortcuts
+        heap: List[Tuple[int, int]] = [(len(adjacent), v) for v, adjacent in enumerate(neighbours)]
+        heap.sort()
+        rank: List[int] = [-1] * vertex_count
+        upper: List[List[int]] = [[] for _ in range(vertex_count)]
+        position: int = 0
+        while heap:
+            degree, v = heappop(heap)
+            if rank[v] >= 0 or degree != len(neighbours[v]):
+                continue  # contracted already or stale degree
+            rank[v] = position
+            position += 1
+            adjacent = neighbours[v]
+            upper[v] = list(adjacent)
+            for w in adjacent:
+                neighbours[w].discard(v)
+                neighbours[w].update(adjacent)
+                neighbours[w].discard(w)
+            for w in adjacent:
+                heappush(heap, (len(neighbours[w]), w))
+            neighbours[v] = set()
+
+        arc_offsets = np.zeros(vertex_count + 1, dtype=np.int32)
+        arc_heads: List[int] = []
+        arc_of: Dict[Tuple[int, int], int] = {}
+        parent = np.full(vertex_count, -1, dtype=np.int32)
+        for v in range(vertex_count):
+            upper[v].sort(key=rank.__getitem__)
+            for w in upper[v]:
+                arc_of[v, w] = len(arc_heads)
+                arc_heads.append(w)
+            arc_offsets[v + 1] = len(arc_heads)
+            if upper[v]:
+                parent[v] = upper[v][0]
+
+        level: List[int] = [0] * vertex_count
+        for v in sorted(range(vertex_count), key=rank.__getitem__):
+            if parent[v] >= 0:
+                level[parent[v]] = max(level[parent[v]], level[v] + 1)
+
+        triangles: List[Tuple[int, int, int, int]] = []  # (level of w, arc w-x, arc u-w, arc u-x)
+        for u in range(vertex_count):
+            above = upper[u]
+            for i, w in enumerate(above):
+                for x in above[i + 1:]:
+                    triangles.append((level[w], arc_of[w, x], arc_of[u, w], arc_of[u, x]))
+        triangles.sort()
+        table = np.array(triangles, dtype=np.int32).reshape(-1, 4)
+        levels = max(level, default=-1) + 1
+        level_offsets = np.searchsorted(table[:, 0], np.arange(levels + 1)).astype(np.int32)
+
+        rank_array = np.array(rank, dtype=np.int32)
+        edge_upward = rank_array[tails] < rank_array[heads]
+        edge_arc = np.array([-1 if u == v else arc_of[(u, v) if up else (v, u)] for u, v, up in
+                             zip(tails.tolist(), heads.tolist(), edge_upward.tolist())], dtype=np.int32)
+        return cls(tails, heads, rank_array, arc_offsets, np.array(arc_heads, dtype=np.int32), parent, edge_arc,
+                   edge_upward, np.ascontiguousarray(table[:, 1]), np.ascontiguousarray(table[:, 2]),
+                   np.ascontiguousarray(table[:, 3]), level_offsets)
+
+    def save(self, path: str) -> None:
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(f, tails=self.tails, heads=self.heads, rank=self.rank, arc_offsets=self.arc_offsets,
+                     arc_heads=self.arc_heads, parent=self.parent, edge_arc=self.edge_arc,
+                     edge_upward=self.edge_upward, tri_target=self.tri_target, tri_first=self.tri_first,
+                     tri_second=self.tri_second, level_offsets=self.level_offsets)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> ContractionHierarchy:
+        with np.load(path) as data:
+            return cls(*(data[name] for name in ('tails', 'heads', 'rank', 'arc_offsets', 'arc_heads', 'parent',
+                                                 'edge_arc', 'edge_upward', 'tri_target', 'tri_first',
+                                                 'tri_second', 'level_offsets')))
+
+    # True if the hierarchy was built for exactly these edges
+    def matches(self, tails: Sequence[int], heads: Sequence[int]) -> bool:
+        return np.array_equal(self.tails, tails) and np.array_equal(self.heads, heads)
+
+    '''Takes the weight of every edge number and returns the Metric for it: every arc first gets the lightest edge
+    it stands for, then the lower triangles are applied level by level, each level as a few array operations'''
+
+    def customize(self, weights: Sequence[float]) -> Metric:
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(weights) != self.edge_count:
+            raise ValueError(f"expected {self.edge_count} weights, got {len(weights)}")
+        up = np.full(self.arc_count, np.inf)
+        down = np.full(self.arc_count, np.inf)
+        real = self.edge_arc >= 0
+        upward = real & self.edge_upward
+        downward = real & ~self.edge_upward
+        np.minimum.at(up, self.edge_arc[upward], weights[upward])
+        np.minimum.at(down, self.edge_arc[downward], weights[downward])
+        up_via = np.full(self.arc_count, -1, dtype=np.int32)
+        down_via = np.full(self.arc_count, -1, dtype=np.int32)
+
+        bounds = self.level_offsets.tolist()
+        for start, end in zip(bounds, bounds[1:]):
+            if start == end:
+                continue
+            target = self.tri_target[start:end]
+            first = self.tri_first[start:end]
+            second = self.tri_second[start:end]
+            # w -> u -> x for the upward direction of w-x, x -> u -> w for the downward one
+            for values, via, over in ((up, up_via, down[first] + up[second]),
+                                      (down, down_via, down[second] + up[first])):
+                before = values[target]
+                np.minimum.at(values, target, over)
+                won = (over < before) & (over == values[target])
+                via[target[won]] = np.arange(start, end, dtype=np.int32)[won]
+        return Metric(self, up, down, up_via, down_via)
+
+
+class Metric:
+    '''A ContractionHierarchy customized for one weight vector: up[a] is the shortest distance from arc_lower[a] to
+    arc_heads[a] over lower ranked vertices, down[a] the one back; up_via / down_via hold the triangle a distance
+    came from (-1 if it is the weight of an edge), to unpack shortcuts into the edges of the graph'''
+
+    def __init__(self, hierarchy: ContractionHierarchy, up: np.ndarray, down: np.ndarray, up_via: np.ndarray,
+                 down_via: np.ndarray) -> None:
+        self.hierarchy: ContractionHierarchy = hierarchy
+        self.up: List[float] = up.tolist()
+        self.down: List[float] = down.tolist()
+        self.up_via: List[int] = up_via.tolist()
+        self.down_via: List[int] = down_via.tolist()
+
+    # Relax the upward arcs along the elimination tree path from root; returns {vertex: (distance, arc reached over)}
+    def _upward(self, root: int, weights: List[float]) -> Dict[int, Tuple[float, int]]:
+        h = self.hierarchy
+        offsets, heads, parent = h._offsets, h._heads, h._parent
+        reached: Dict[int, Tuple[float, int]] = {root: (0.0, -1)}
+        v: int = root
+        while v >= 0:
+            if v in reached:
+                dist_v: float = reached[v][0]
+                for arc in range(offsets[v], offsets[v + 1]):
+                    w: int = heads[arc]
+                    dist_w: float = dist_v + weights[arc]
+                    if w not in reached or dist_w < reached[w][0]:
+                        reached[w] = (dist_w, arc)
+            v = parent[v]
+        return reached
+
+    # Append the edges behind arc in the given direction to path
+    def _unpack(self, arc: int, upward: bool, path: WeightedPath) -> None:
+        h = self.hierarchy
+        stack: List[Tuple[int, bool]] = [(arc, upward)]
+        while stack:
+            arc, upward = stack.pop()
+            triangle: int = (self.up_via if upward else self.down_via)[arc]
+            if triangle < 0:
+                lower, higher = h._lower[arc], h._heads[arc]
+                path.append(WeightedEdge(lower, higher, self.up[arc]) if upward else
+                            WeightedEdge(higher, lower, self.down[arc]))
+            else:
+                first, second = int(h.tri_first[triangle]), int(h.tri_second[triangle])
+                # pushed in reverse, so the first half is unpacked first
+                if upward:
+                    stack.extend(((second, True), (first, False)))
+                else:
+                    stack.extend(((first, True), (second, False)))
+
+    '''Bidirectional upward search between vertex indices: both searches only climb the elimination tree, and the
+    route meets at the best vertex both reached. Returns the distance (None if target can not be reached) and the
+    route as a WeightedPath of graph edges'''
+
+    def query(self, source: int, target: int) -> Tuple[Optional[float], WeightedPath]:
+        if source == target:
+            return 0.0, []
+        forward = self._upward(source, self.up)
+        backward = self._upward(target, self.down)
+        best: float = float('inf')
+        meet: int = -1
+        for v, (dist_v, _) in forward.items():
+            if v in backward and dist_v + backward[v][0] < best:
+                best = dist_v + backward[v][0]
+                meet = v
+        if meet < 0:
+            return None, []
+        arcs: List[int] = []
+        v = meet
+        while v != source:
+            arc = forward[v][1]
+            arcs.append(arc)
+            v = self.hierarchy._lower[arc]
+        path: WeightedPath = []
+        for arc in reversed(arcs):
+            self._unpack(arc, True, path)
+        v = meet
+        while v != target:
+            arc = backward[v][1]
+            self._unpack(arc, False, path)
+            v = self.hierarchy._lower[arc]
+        return best, path
+
+
+_city_hierarchy: Optional[ContractionHierarchy] = None
+
+
+'''Returns the hierarchy of the city graph, loaded from path; it is built and saved first when the file is missing
+or was built for other edges than the ones in the snapshot'''
+
+
+def city_hierarchy(path: str = 'city.cch.npz') -> ContractionHierarchy:
+    global _city_hierarchy
+    if _city_hierarchy is None:
+        snapshot = sn.city_snapshot()
+        hierarchy = ContractionHierarchy.load(path) if os.path.exists(path) else None
+        if hierarchy is None or not hierarchy.matches(snapshot.tails, snapshot.heads):
+            with ins.stage('contraction'):
+                hierarchy = ContractionHierarchy.build(snapshot.tails, snapshot.heads, snapshot.vertex_count)
+            hierarchy.save(path)
+        _city_hierarchy = hierarchy
+    return _city_hierarchy
+
+
+'''Same route as dijkstra_main, answered by customizing the city hierarchy for the weights of timestamp and one
+upward query; prints the route and returns its duration'''
+
+
+def cch_main(timestamp, per=None, source="94", target="162"):
+    if per is None:
+        per = sn.city_snapshot().hour_percentages(rh.hour_of(timestamp))
+    with ins.stage('edge_weights'):
+        weights = dij.edge_weights(timestamp, per)
+    g = dij.city_graph()
+    with ins.stage('customization'):
+        metric = city_hierarchy().customize(weights)
+    with ins.stage('search'):
+        _, path = metric.query(g.index_of(source), g.index_of(target))
+    ins.emit("Optimal shortest route from {} to {} at {}:".format(source, target, timestamp))
+    return print_weighted_path(g, path, timestamp)
+
+
+if __name__ == '__main__':
+    city_hierarchy()
@@ -0,0 +1,150 @@
+from __future__ import annotations
+from array import array
+from typing import TypeVar, Generic, List, Tuple, Iterable, Dict, Sequence
+from weighted_edge import WeightedEdge
+from weighted_graph import WeightedGraph
+
+
+V = TypeVar('V')  # type of the vertices in the graph
+
+
+class CSRGraph(Generic[V]):
+    '''Compressed sparse row graph: the edges leaving vertex u are the positions offsets[u] .. offsets[u + 1] - 1
+    of the flat targets/weights buffers; edge_numbers maps every position back to the edge number in graph.csv.
+    from_weighted_graph and to_weighted_graph copy the edges, the WeightedGraph keeps its own adjacency lists; both
+    sides keep the edge numbers, so the same weight vector passed to update_weights of each keeps them equal'''
+
+    def __init__(self, vertices: List[V], offsets: array, targets: array, weights: array,
+                 edge_numbers: array) -> None:
+        self._vertices: List[V] = vertices
+        self._indices: Dict[V, int] = {}  # vertex -> index of its first occurrence
+        for i, vertex in enumerate(vertices):
+            self._indices.setdefault(vertex, i)
+        self.offsets: array = offsets  # length vertex_count + 1
+        self.targets: array = targets  # head vertex index of every position
+        self.weights: array = weights  # weight of every position
+        self.edge_numbers: array = edge_numbers  # edge number of every position
+        self.tails: array = array('l', [0] * len(targets))  # tail vertex index of every position
+        for u in range(len(vertices)):
+            for pos in range(offsets[u], offsets[u + 1]):
+                self.tails[pos] = u
+
+    # Build the graph in one pass from (u, v, weight) index triples; the n-th triple gets edge number n
+    @classmethod
+    def from_edges(cls, vertices: List[V], edges: Iterable[Tuple[int, int, float]]) -> CSRGraph[V]:
+        tails: List[int] = []
+        heads: List[int] = []
+        values: List[float] = []
+        for u, v, weight in edges:
+            tails.append(u)
+            heads.append(v)
+            values.append(weight)
+
+        offsets: array = array('l', [0] * (len(vertices) + 1))
+        for u in tails:
+            offsets[u + 1] += 1
+        for i in range(len(vertices)):
+            offsets[i + 1] += offsets[i]
+
+        # stable counting sort by tail, so every row keeps insertion order
+        fill: List[int] = list(offsets[:-1])
+        targets: array = array('l', [0] * len(tails))
+        weights: array = array('d', [0.0] * len(tails))
+        edge_numbers: array = array('l', [0] * len(tails))
+        for number, u in enumerate(tails):
+            pos: int = fill[u]
+            fill[u] += 1
+            targets[pos] = heads[number]
+            weights[pos] = values[number]
+            edge_numbers[pos] = number
+        return cls(vertices, offsets, targets, weights, edge_numbers)
+
+    # Copy an existing WeightedGraph; edges keep the numbers of wg.edge_numbers()
+    @classmethod
+    def from_weighted_graph(cls, wg: WeightedGraph[V]) -> CSRGraph[V]:
+        adjacency = [we for i in range(wg.vertex_count) for we in wg.edges_for_index(i)]
+        by_number: List[WeightedEdge] = list(adjacency)
+        for we, number in zip(adjacency, wg.edge_numbers()):
+            by_number[number] = we
+        edges = ((we.u, we.v, we.weight) for we in by_number)
+        return cls.from_edges([wg.vertex_at(i) for i in range(wg.vertex_count)], edges)
+
+    # Build a WeightedGraph with the same vertices, edges, weights and edge numbers
+    def to_weighted_graph(self) -> WeightedGraph[V]:
+        wg: WeightedGraph[V] = WeightedGraph(list(self._vertices))
+        for u in range(self.vertex_count):
+            for pos in range(self.offsets[u], self.offsets[u + 1]):
+                wg.add_edge_by_indices(u, self.targets[pos], self.weights[pos], self.edge_numbers[pos])
+        return wg
+
+    # Swap in a new weight for every edge; weights[n] is the weight of edge number n. The topology is untouched
+    # and no objects are allocated, so one graph can be reweighted for every timestamp
+    def update_weights(self, weights: Sequence[float]) -> None:
+        if len(weights) != self.edge_count:
+            raise ValueError(f"expected {self.edge_count} weights, got {len(weights)}")
+        buffer: array = self.weights
+        for pos, number in enumerate(self.edge_numbers):
+            buffer[pos] = weights[number]
+
+    # Copy that shares the (read only) topology buffers but has its own weights
+    def copy(self) -> CSRGraph[V]:
+        return CSRGraph(self._vertices, self.offsets, self.targets, array('d', self.weights), self.edge_numbers)
+
+    # Build the transposed graph (every edge u -> v becomes v -> u) with the same edge numbers and weights
+    def reverse(self) -> CSRGraph[V]:
+        by_number: List[int] = [0] * self.edge_count
+        for pos, number in enumerate(self.edge_numbers):
+            by_number[number] = pos
+        edges = ((self.targets[pos], self.tails[pos], self.weights[pos]) for pos in by_number)
+        return CSRGraph.from_edges(self._vertices, edges)
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self._vertices)  # Number of vertices
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)  # Number of edges
+
+    # Find the vertex at a specific index
+    def vertex_at(self, index: int) -> V:
+        return self._vertices[index]
+
+    # Find the index of a vertex in the graph
+    def index_of(self, vertex: V) -> int:
+        try:
+            return self._indices[vertex]
+        except KeyError:
+            raise ValueError(f"{vertex!r} is not in graph") from None
+
+    # Create the edge stored at a CSR position
+    def edge_at(self, pos: int) -> WeightedEdge:
+        return WeightedEdge(self.tails[pos], self.targets[pos], self.weights[pos], self.edge_numbers[pos])
+
+    # Return all the edges associated with a vertex at some index; they are created on demand
+    def edges_for_index(self, index: int) -> List[WeightedEdge]:
+        return [WeightedEdge(index, self.targets[pos], self.weights[pos], self.edge_numbers[pos])
+                for pos in range(self.offsets[index], self.offsets[index + 1])]
+
+    # Lookup the index of a vertex and return its edges (convenience method)
+    def edges_for_vertex(self, vertex: V) -> List[WeightedEdge]:
+        return self.edges_for_index(self.index_of(vertex))
+
+    # Find the vertices that a vertex at some index is connected to
+    def neighbors_for_index(self, index: int) -> List[V]:
+        return [self._vertices[self.targets[pos]] for pos in range(self.offsets[index], self.offsets[index + 1])]
+
+    # Lookup a vertice's index and find its neighbors (convenience method)
+    def neighbors_for_vertex(self, vertex: V) -> List[V]:
+        return self.neighbors_for_index(self.index_of(vertex))
+
+    def neighbors_for_index_with_weights(self, index: int) -> List[Tuple[V, float]]:
+        return [(self._vertices[self.targets[pos]], self.weights[pos])
+                for pos in range(self.offsets[index], self.offsets[index + 1])]
+
+    def __str__(self) -> str:
+        desc: str = ""
+        for i in range(self.vertex_count):
+            desc += f"{self.vertex_at(i)} -> {self.neighbors_for_index_with_weights(i)}\n"
+        return desc
+
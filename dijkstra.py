@@ -14,46 +14,67 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from __future__ import annotations
-from typing import TypeVar, List, Optional, Tuple, Dict
+from typing import TypeVar, List, Optional, Tuple, Dict, Callable
 from dataclasses import dataclass
 from mst import WeightedPath, print_weighted_path
+import os
+from heapq import heappush, heappop
+from array import array
 from weighted_graph import WeightedGraph
 from weighted_edge import WeightedEdge
-from priority_queue import PriorityQueue
-print('Algorithm running...')
-import parse_csv as pc
-import duration as dur
-import hourly_percentages as hp
+from priority_queue import IndexedPriorityQueue
+from csr_graph import CSRGraph
+import geo
+import duration_cache as dc
+import snapshot as sn
+import instrumentation as ins
+import route_history as rh
 
 V = TypeVar('V')  # type of the vertices in the graph
+# route queries use ALT on the city landmarks (landmarks.py) instead of the bidirectional search
+use_landmarks: bool = os.environ.get('ROUTE_ALT', '') not in ('', '0')
 
 
+# Counts the work done by a search; pass one to dijkstra() to compare variants
 @dataclass
-class DijkstraNode:
-    vertex: int
-    distance: float
+class SearchStats:
+    pushes: int = 0  # vertices inserted into the queue
+    decreases: int = 0  # decrease_key calls on queued vertices
+    pops: int = 0  # vertices settled
+    relaxations: int = 0  # edges examined
 
-    def __lt__(self, other: DijkstraNode) -> bool:
-        return self.distance < other.distance
+    def __iadd__(self, other: SearchStats) -> SearchStats:
+        self.pushes += other.pushes
+        self.decreases += other.decreases
+        self.pops += other.pops
+        self.relaxations += other.relaxations
+        return self
 
-    def __eq__(self, other: DijkstraNode) -> bool:
-        return self.distance == other.distance
 
-
-def dijkstra(wg: WeightedGraph[V], root: V) -> Tuple[List[Optional[float]], Dict[int, WeightedEdge]]:
+# With a target the search stops as soon as the target is settled; then only the distances of settled
+# vertices (and the path to the target) are final
+def dijkstra(wg: WeightedGraph[V], root: V, stats: Optional[SearchStats] = None,
+             target: Optional[V] = None) -> Tuple[List[Optional[float]], Dict[int, WeightedEdge]]:
+    if stats is None:
+        stats = SearchStats()
     first: int = wg.index_of(root)  # find starting index
+    last: int = -1 if target is None else wg.index_of(target)
     # distances are unknown at first
     distances: List[Optional[float]] = [None] * wg.vertex_count
     distances[first] = 0  # the root is 0 away from the root
     path_dict: Dict[int, WeightedEdge] = {}  # how we got to each vertex
-    pq: PriorityQueue[DijkstraNode] = PriorityQueue()
-    pq.push(DijkstraNode(first, 0))
+    pq: IndexedPriorityQueue = IndexedPriorityQueue(wg.vertex_count)
+    pq.push(first, 0)
+    stats.pushes += 1
 
     while not pq.empty:
-        u: int = pq.pop().vertex  # explore the next closest vertex
-        dist_u: float = distances[u]  # should already have seen it
+        u, dist_u = pq.pop()  # explore the next closest vertex, its distance is final now
+        stats.pops += 1
+        if u == last:
+            break  # the path to the target can not get shorter any more
         # look at every edge/vertex from the vertex in question
         for we in wg.edges_for_index(u):
+            stats.relaxations += 1
             # the old distance to this vertex
             dist_v: float = distances[we.v]
             # no old distance or found shorter path
@@ -62,12 +83,179 @@ def dijkstra(wg: WeightedGraph[V], root: V) -> Tuple[List[Optional[float]], Dict
                 distances[we.v] = we.weight + dist_u
                 # update the edge on the shortest path to this vertex
                 path_dict[we.v] = we
-                # explore it soon
-                pq.push(DijkstraNode(we.v, we.weight + dist_u))
+                # explore it soon; a queued vertex is moved up instead of being queued twice
+                if we.v in pq:
+                    pq.decrease_key(we.v, we.weight + dist_u)
+                    stats.decreases += 1
+                else:
+                    pq.push(we.v, we.weight + dist_u)
+                    stats.pushes += 1
+
+    return distances, path_dict
+
+
+# Same search on the flat buffers of a CSRGraph; the heap holds plain (distance, vertex) tuples and
+# WeightedEdge objects are only created for the final path_dict
+def dijkstra_csr(g: CSRGraph[V], root: V, stats: Optional[SearchStats] = None,
+                 target: Optional[V] = None) -> Tuple[List[Optional[float]], Dict[int, WeightedEdge]]:
+    if stats is None:
+        stats = SearchStats()
+    offsets, targets, weights = g.offsets, g.targets, g.weights
+    first: int = g.index_of(root)
+    last: int = -1 if target is None else g.index_of(target)
+    distances: List[Optional[float]] = [None] * g.vertex_count
+    distances[first] = 0
+    via: List[int] = [-1] * g.vertex_count  # CSR position of the edge on the shortest path to each vertex
+    heap: List[Tuple[float, int]] = [(0, first)]
+    pushes: int = 1
+    pops: int = 0
+    relaxations: int = 0
+
+    while heap:
+        dist_u, u = heappop(heap)
+        if dist_u > distances[u]:
+            continue  # stale entry, u was already reached on a shorter path
+        pops += 1
+        if u == last:
+            break
+        relaxations += offsets[u + 1] - offsets[u]
+        for pos in range(offsets[u], offsets[u + 1]):
+            v: int = targets[pos]
+            dist_v: float = dist_u + weights[pos]
+            if distances[v] is None or distances[v] > dist_v:
+                distances[v] = dist_v
+                via[v] = pos
+                heappush(heap, (dist_v, v))
+                pushes += 1
+
+    stats.pushes += pushes
+    stats.pops += pops
+    stats.relaxations += relaxations
+    path_dict: Dict[int, WeightedEdge] = {v: g.edge_at(pos) for v, pos in enumerate(via) if pos >= 0}
+    return distances, path_dict
+
+
+# Point-to-point search that grows one tree forward from root on g and one backward from target on reverse
+# (g.reverse() with the same weights), always expanding the side with the smaller queue head. It stops once the
+# two queue heads together can not beat the best path through a vertex seen from both sides. Returns the same
+# (distances, path_dict) shape as dijkstra(): distances of the forward tree plus the vertices of the path, and
+# path_dict edges that lead from root to target
+def bidirectional_dijkstra(g: CSRGraph[V], reverse: CSRGraph[V], root: V, target: V,
+                           stats: Optional[SearchStats] = None) -> Tuple[List[Optional[float]],
+                                                                         Dict[int, WeightedEdge]]:
+    if stats is None:
+        stats = SearchStats()
+    first: int = g.index_of(root)
+    last: int = g.index_of(target)
+    # index 0 is the forward search on g, index 1 the backward search on reverse
+    graphs: Tuple[CSRGraph[V], CSRGraph[V]] = (g, reverse)
+    distances: Tuple[List[Optional[float]], List[Optional[float]]] = ([None] * g.vertex_count,
+                                                                       [None] * g.vertex_count)
+    via: Tuple[List[int], List[int]] = ([-1] * g.vertex_count, [-1] * g.vertex_count)
+    settled: Tuple[List[bool], List[bool]] = ([False] * g.vertex_count, [False] * g.vertex_count)
+    heaps: Tuple[List[Tuple[float, int]], List[Tuple[float, int]]] = ([(0, first)], [(0, last)])
+    distances[0][first] = 0
+    distances[1][last] = 0
+    stats.pushes += 2
+    best: float = 0 if first == last else float('inf')  # length of the shortest path seen so far
+    meeting: int = first  # vertex where that path crosses from the forward to the backward tree
 
+    while heaps[0] and heaps[1] and heaps[0][0][0] + heaps[1][0][0] < best:
+        side: int = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        dist_u, u = heappop(heaps[side])
+        if settled[side][u]:
+            continue  # stale entry
+        settled[side][u] = True
+        stats.pops += 1
+        wg: CSRGraph[V] = graphs[side]
+        dist, other = distances[side], distances[1 - side]
+        for pos in range(wg.offsets[u], wg.offsets[u + 1]):
+            stats.relaxations += 1
+            v: int = wg.targets[pos]
+            dist_v: float = dist_u + wg.weights[pos]
+            if dist[v] is None or dist[v] > dist_v:
+                dist[v] = dist_v
+                via[side][v] = pos
+                heappush(heaps[side], (dist_v, v))
+                stats.pushes += 1
+            if other[v] is not None and dist[v] + other[v] < best:
+                best = dist[v] + other[v]
+                meeting = v
+
+    forward: List[Optional[float]] = distances[0]
+    path_dict: Dict[int, WeightedEdge] = {v: g.edge_at(pos) for v, pos in enumerate(via[0]) if pos >= 0}
+    if best == float('inf'):
+        return forward, path_dict
+    # the forward tree ends at the meeting vertex, the rest of the path comes from the backward tree
+    v = meeting
+    while v != last:
+        reversed_edge: WeightedEdge = reverse.edge_at(via[1][v])  # leads from the target side to v
+        edge: WeightedEdge = WeightedEdge(v, reversed_edge.u, reversed_edge.weight, reversed_edge.number)
+        forward[edge.v] = forward[v] + edge.weight
+        path_dict[edge.v] = edge
+        v = edge.v
+    return forward, path_dict
+
+
+# A* search from root to target on g, guided by estimate(v), a lower bound of the remaining weight from v to the
+# target. The bound only has to be admissible, not consistent: a settled vertex that is reached again over a shorter
+# path is opened again. Returns the same (distances, path_dict) shape as dijkstra(..., target=target)
+def heuristic_search(g: CSRGraph[V], root: V, target: V, estimate: Callable[[int], float],
+                     stats: Optional[SearchStats] = None) -> Tuple[List[Optional[float]], Dict[int, WeightedEdge]]:
+    if stats is None:
+        stats = SearchStats()
+    offsets, targets, weights = g.offsets, g.targets, g.weights
+    first: int = g.index_of(root)
+    last: int = g.index_of(target)
+    distances: List[Optional[float]] = [None] * g.vertex_count
+    distances[first] = 0
+    via: List[int] = [-1] * g.vertex_count
+    heap: List[Tuple[float, float, int]] = [(estimate(first), 0, first)]
+    stats.pushes += 1
+
+    while heap:
+        _, dist_u, u = heappop(heap)
+        if dist_u > distances[u]:
+            continue  # stale entry, u was reached over a shorter path since
+        stats.pops += 1
+        if u == last:
+            break
+        for pos in range(offsets[u], offsets[u + 1]):
+            stats.relaxations += 1
+            v: int = targets[pos]
+            dist_v: float = dist_u + weights[pos]
+            if distances[v] is None or distances[v] > dist_v:
+                distances[v] = dist_v
+                via[v] = pos
+                heappush(heap, (dist_v + estimate(v), dist_v, v))
+                stats.pushes += 1
+
+    path_dict: Dict[int, WeightedEdge] = {v: g.edge_at(pos) for v, pos in enumerate(via) if pos >= 0}
     return distances, path_dict
 
 
+# A* with the haversine distance to the target divided by the highest speed (edge length / weight) of the current
+# weights, less the length of the free (weight 0) edges, which never overestimates the remaining weight
+def astar(g: CSRGraph[V], root: V, target: V, coordinates: List[Optional[Tuple[float, float]]],
+          lengths: Optional[array] = None,
+          stats: Optional[SearchStats] = None) -> Tuple[List[Optional[float]], Dict[int, WeightedEdge]]:
+    if lengths is None:
+        lengths = geo.edge_lengths(g, coordinates)
+    last: int = g.index_of(target)
+    speed, slack = geo.speed_bound(g, lengths)
+    estimates: List[Optional[float]] = [None] * g.vertex_count  # heuristic, computed on first use
+
+    def estimate(v: int) -> float:
+        if estimates[v] is None:
+            if speed == 0 or coordinates[v] is None:
+                estimates[v] = 0.0
+            else:
+                estimates[v] = max(0.0, geo.haversine(coordinates[v], coordinates[last]) - slack) / speed
+        return estimates[v]
+
+    return heuristic_search(g, root, target, estimate, stats)
+
+
 # Helper function to get easier access to dijkstra results
 def distance_array_to_vertex_dict(wg: WeightedGraph[V], distances: List[Optional[float]]) -> Dict[V, Optional[float]]:
     distance_dict: Dict[V, Optional[float]] = {}
@@ -90,46 +278,106 @@ def path_dict_to_path(start: int, end: int, path_dict: Dict[int, WeightedEdge])
     return list(reversed(edge_path))
 
 
-'''Takes timestamps and percentages in form of '28 Mr 00_09_47' and lists with length 1308; returns shortest/optimal 
-path cin a particular timestamp with its length'''
+'''The search behind dijkstra_1 and dijkstra_main: bidirectional_dijkstra, or landmarks.route_search if
+use_landmarks is set'''
+
+
+def route_search(g: CSRGraph[V], reverse: CSRGraph[V], root: V, target: V,
+                 stats: Optional[SearchStats] = None) -> Tuple[List[Optional[float]], Dict[int, WeightedEdge]]:
+    if use_landmarks:
+        import landmarks as lm
+        return lm.route_search(g, reverse, root, target, stats)
+    return bidirectional_dijkstra(g, reverse, root, target, stats)
+
+
+_city_graph: Optional[CSRGraph[str]] = None
+_city_graph_reversed: Optional[CSRGraph[str]] = None
+
+
+'''Returns the graph of graph.csv with vertices '0' .. '537', edge numbers as in the file; the topology is read
+from the city snapshot on the first call and then only reweighted'''
+
+
+def city_graph() -> CSRGraph[str]:
+    global _city_graph
+    if _city_graph is None:
+        with ins.stage('graph_build'):
+            snapshot = sn.city_snapshot()
+            edges = ((u, v, 0.0) for u, v in zip(snapshot.tails.tolist(), snapshot.heads.tolist()))
+            _city_graph = CSRGraph.from_edges([str(i) for i in range(snapshot.vertex_count)], edges)
+    return _city_graph
+
 
+'''Returns city_graph().reverse(), built on the first call; it has to be reweighted separately'''
 
-def dijkstra_1(timestamp, per):
-    city_graph2: WeightedGraph[str] = WeightedGraph([str(i) for i in range(538)])
 
-    duration = dur.get_edges_predicted_duration_new(timestamp)
+def city_graph_reversed() -> CSRGraph[str]:
+    global _city_graph_reversed
+    if _city_graph_reversed is None:
+        graph = city_graph()
+        with ins.stage('graph_build'):
+            _city_graph_reversed = graph.reverse()
+    return _city_graph_reversed
+
+
+'''Takes a timestamp and a list of 1308 percentages; returns the weight duration * (1 - percentage) of every edge,
+indexed by edge number'''
+
+
+def edge_weights(timestamp, per):
+    duration = dc.get_edges_predicted_duration(timestamp)
+    return [duration[i] * (1 - per[i]) for i in range(len(per))]
+
+
+'''Takes timestamps and percentages in form of '28 Mr 00_09_47' and lists with length 1308; returns shortest/optimal 
+path cin a particular timestamp with its length'''
+
 
-    graph = pc.graph
-    for i in range(1, len(graph)):
-        fro = graph[i].get('from')
-        to = graph[i].get('to')
-        percentage = 1 - (per[i - 1])
-        city_graph2.add_edge_by_vertices(str(fro), str(to), duration[i-1] * percentage)
+def dijkstra_1(timestamp, per, stats=None):
+    with ins.stage('edge_weights'):
+        weights = edge_weights(timestamp, per)
+    city_graph2: CSRGraph[str] = city_graph()
+    reverse: CSRGraph[str] = city_graph_reversed()
+    with ins.stage('reweight'):
+        city_graph2.update_weights(weights)
+        reverse.update_weights(weights)
 
-    distances, path_dict = dijkstra(city_graph2, "94")
+    search: SearchStats = SearchStats()
+    with ins.stage('search'):
+        distances, path_dict = route_search(city_graph2, reverse, "94", "162", search)
+    ins.count_search(search)
+    if stats is not None:
+        stats += search
 
-    print("Shortest path from 94 to 162 at {}:".format(timestamp))
+    ins.emit("Shortest path from 94 to 162 at {}:".format(timestamp))
     path: WeightedPath = path_dict_to_path(city_graph2.index_of("94"), city_graph2.index_of("162"), path_dict)
     p = print_weighted_path(city_graph2, path, timestamp)
     return p
 
 
-def dijkstra_main(timestamp):
-    city_graph2: WeightedGraph[str] = WeightedGraph([str(i) for i in range(538)])
+'''Same as dijkstra_1, but the percentages default to the hourly percentages of the timestamp's hour; both count
+the search work in stats if given'''
 
-    duration = dur.get_edges_predicted_duration_new(timestamp)
-    ind = int(timestamp.split()[2].split('_')[0])
 
-    graph = pc.graph
-    for i in range(1, len(graph)):
-        fro = graph[i].get('from')
-        to = graph[i].get('to')
-        percentage = 1 - (hp.perc[ind][i - 1])
-        city_graph2.add_edge_by_vertices(str(fro), str(to), duration[i - 1] * percentage)
+def dijkstra_main(timestamp, per=None, stats=None):
+    if per is None:
+        per = sn.city_snapshot().hour_percentages(rh.hour_of(timestamp))
+    with ins.stage('edge_weights'):
+        weights = edge_weights(timestamp, per)
+    city_graph2: CSRGraph[str] = city_graph()
+    reverse: CSRGraph[str] = city_graph_reversed()
+    with ins.stage('reweight'):
+        city_graph2.update_weights(weights)
+        reverse.update_weights(weights)
 
-    distances, path_dict = dijkstra(city_graph2, "94")
+    search: SearchStats = SearchStats()
+    with ins.stage('search'):
+        distances, path_dict = route_search(city_graph2, reverse, "94", "162", search)
+    ins.count_search(search)
+    if stats is not None:
+        stats += search
 
-    print("Optimal shortest route from 94 to 162 at {}:".format(timestamp))
+    ins.emit("Optimal shortest route from 94 to 162 at {}:".format(timestamp))
     path: WeightedPath = path_dict_to_path(city_graph2.index_of("94"), city_graph2.index_of("162"), path_dict)
     p = print_weighted_path(city_graph2, path, timestamp)
     return p
@@ -0,0 +1,146 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Iterator, List, Mapping, Optional, Tuple
+import numpy as np
+import dijkstra as dij
+import route_history as rh
+import snapshot as sn
+from csr_graph import CSRGraph
+from mst import WeightedPath
+from weighted_edge import WeightedEdge
+
+
+class DistanceTable:
+    '''Shortest distances between all vertex pairs under one set of weights: distances[s, v] (float32, inf where v can
+    not be reached from s) and predecessors[s, v], the vertex before v on the path from s (int16, -1 for s itself and
+    unreachable vertices). weights keeps the weight of every CSR position, for the edges of reconstructed paths'''
+
+    def __init__(self, g: CSRGraph, distances: np.ndarray, predecessors: np.ndarray, weights: np.ndarray) -> None:
+        self.graph: CSRGraph = g
+        self.distances: np.ndarray = distances
+        self.predecessors: np.ndarray = predecessors
+        self.weights: np.ndarray = weights
+
+    # Floyd-Warshall on the current weights of g over dense n x n arrays: for every intermediate vertex k one
+    # vectorized pass relaxes all pairs through k. Sums are formed in float64 and stored as float32
+    @classmethod
+    def build(cls, g: CSRGraph) -> DistanceTable:
+        n: int = g.vertex_count
+        if n > np.iinfo(np.int16).max:
+            raise ValueError(f"{n} vertices do not fit into int16 predecessors")
+        weights = np.array(g.weights, dtype=np.float64)
+        tails, heads = np.asarray(g.tails), np.asarray(g.targets)
+        distances = np.full((n, n), np.inf)
+        np.minimum.at(distances, (tails, heads), weights)  # of parallel edges the lightest
+        np.fill_diagonal(distances, 0)
+        predecessors = np.where(distances < np.inf, np.arange(n, dtype=np.int16)[:, None], -1).astype(np.int16)
+        np.fill_diagonal(predecessors, -1)
+        through = np.empty_like(distances)
+        shorter = np.empty((n, n), dtype=bool)
+        for k in range(n):
+            # row and column k do not change in this pass (distances[k, k] is 0), so they can be read in place
+            np.add(distances[:, k, None], distances[None, k, :], out=through)
+            np.less(through, distances, out=shorter)
+            np.copyto(distances, through, where=shorter)
+            np.copyto(predecessors, predecessors[k], where=shorter)
+        return cls(g, distances.astype(np.float32), predecessors, weights)
+
+    def distance(self, u: int, v: int) -> Optional[float]:
+        d = float(self.distances[u, v])
+        return None if d == np.inf else d
+
+    # Lightest edge from u to v, the one a shortest path takes
+    def edge(self, u: int, v: int) -> WeightedEdge:
+        g = self.graph
+        best = min((pos for pos in range(g.offsets[u], g.offsets[u + 1]) if g.targets[pos] == v),
+                   key=lambda pos: self.weights[pos])
+        return WeightedEdge(u, v, float(self.weights[best]), g.edge_numbers[best])
+
+    # The predecessors of source as a path_dict, so dij.path_dict_to_path reconstructs the paths from it
+    def path_dict(self, source: int) -> PredecessorRow:
+        return PredecessorRow(self, source)
+
+    def path(self, u: int, v: int) -> WeightedPath:
+        if u == v or self.predecessors[u, v] < 0:
+            return []
+        return dij.path_dict_to_path(u, v, self.path_dict(u))
+
+
+class PredecessorRow(Mapping):
+    '''Read only view of one row of the predecessor matrix with the interface of a path_dict: vertex -> the edge
+    it is reached over'''
+
+    def __init__(self, table: DistanceTable, source: int) -> None:
+        self.table: DistanceTable = table
+        self.row: np.ndarray = table.predecessors[source]
+
+    def __getitem__(self, v: int) -> WeightedEdge:
+        u = int(self.row[v])
+        if u < 0:
+            raise KeyError(v)
+        return self.table.edge(u, v)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(np.flatnonzero(self.row >= 0).tolist())
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.row >= 0))
+
+
+class TableCache:
+    '''Bounded LRU of DistanceTables of the city graph keyed by (hour, timestamp); a table is about 1.7 MB'''
+
+    def __init__(self, maxsize: int = 32) -> None:
+        self.maxsize: int = maxsize
+        self._tables: OrderedDict = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, timestamp: str) -> DistanceTable:
+        hour = rh.hour_of(timestamp)
+        key: Tuple[int, str] = (hour, timestamp)
+        table = self._tables.get(key)
+        if table is not None:
+            self.hits += 1
+            self._tables.move_to_end(key)
+            return table
+        self.misses += 1
+        table = city_table(timestamp)
+        self._tables[key] = table
+        if len(self._tables) > self.maxsize:
+            self._tables.popitem(last=False)
+        return table
+
+    def clear(self) -> None:
+        self._tables.clear()
+        self.hits = self.misses = 0
+
+
+cache = TableCache()
+
+
+'''Takes a timestamp in form of '28 Mr 00_09_47'; returns the DistanceTable of the city graph weighted like
+dijkstra_main (per defaults to the hour's percentages). The table has its own copy of the graph'''
+
+
+def city_table(timestamp, per=None):
+    if per is None:
+        per = sn.city_snapshot().hour_percentages(rh.hour_of(timestamp))
+    g = dij.city_graph().copy()
+    g.update_weights(dij.edge_weights(timestamp, per))
+    return DistanceTable.build(g)
+
+
+'''Takes origin and destination vertex names and a timestamp; returns the route as a list of vertex names and its
+weight, ([], None) if there is none, read from the cached table of the timestamp'''
+
+
+def od_route(origin, destination, timestamp) -> Tuple[List[str], Optional[float]]:
+    table = cache.get(timestamp)
+    g = table.graph
+    u, v = g.index_of(origin), g.index_of(destination)
+    weight = table.distance(u, v)
+    if weight is None:
+        return [], None
+    path = table.path(u, v)
+    return [g.vertex_at(e.u) for e in path] + [destination], weight
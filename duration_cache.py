@@ -0,0 +1,83 @@
+from collections import OrderedDict, namedtuple
+import os
+import numpy as np
+import instrumentation as ins
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'disk_hits', 'misses', 'maxsize', 'currsize'])
+
+
+class DurationCache:
+    '''Bounded LRU cache of dur.get_edges_predicted_duration_new(timestamp). With a path it is backed by
+    <path>.npy, a (timestamps x 1308) matrix opened memory-mapped, and <path>.txt, its timestamps one per line;
+    save() writes both, so predictions survive across runs'''
+
+    def __init__(self, maxsize=4400, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self._entries = OrderedDict()  # timestamp -> durations, most recently used last
+        self._rows = {}  # timestamp -> row of the matrix on disk
+        self._matrix = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path + '.npy'):
+            self._matrix = np.load(path + '.npy', mmap_mode='r')
+            with open(path + '.txt') as f:
+                self._rows = {line.rstrip('\n'): row for row, line in enumerate(f)}
+
+    '''Takes a timestamp in form of '28 Mr 00_09_47'; returns the predicted duration of every edge'''
+
+    def get(self, timestamp):
+        durations = self._entries.get(timestamp)
+        if durations is not None:
+            self.hits += 1
+            self._entries.move_to_end(timestamp)
+            return durations
+        row = self._rows.get(timestamp)
+        if row is not None:
+            self.disk_hits += 1
+            return self._matrix[row]
+        self.misses += 1
+        with ins.stage('predicted_duration'):
+            import duration as dur  # loads the prediction model, so only on the first miss
+            durations = dur.get_edges_predicted_duration_new(timestamp)
+        self._entries[timestamp] = durations
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return durations
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.disk_hits, self.misses, self.maxsize, len(self._entries))
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.disk_hits = self.misses = 0
+
+    '''Writes the rows on disk plus the ones in memory to <path>.npy and <path>.txt'''
+
+    def save(self, path=None):
+        path = self.path if path is None else path
+        timestamps = list(self._rows) + [t for t in self._entries if t not in self._rows]
+        if not timestamps:
+            return
+        matrix = np.array([self._matrix[self._rows[t]] if t in self._rows else self._entries[t] for t in timestamps],
+                          dtype=np.float64)
+        self._matrix = None  # release the memory map before the file is replaced
+        np.save(path + '.npy', matrix)
+        with open(path + '.txt', 'w') as f:
+            f.writelines(timestamp + '\n' for timestamp in timestamps)
+        self.path = path
+        self._matrix = np.load(path + '.npy', mmap_mode='r')
+        self._rows = {timestamp: row for row, timestamp in enumerate(timestamps)}
+
+
+cache = DurationCache()  # shared by dijkstra and mst
+ins.register_collector(lambda: {'duration_cache_hits': cache.hits, 'duration_cache_disk_hits': cache.disk_hits,
+                                'duration_cache_misses': cache.misses})
+
+
+'''Takes a timestamp in form of '28 Mr 00_09_47'; returns the predicted duration of every edge from the shared cache'''
+
+
+def get_edges_predicted_duration(timestamp):
+    return cache.get(timestamp)
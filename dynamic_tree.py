@@ -0,0 +1,173 @@
+from heapq import heappush, heappop
+from typing import Dict, List, Optional, Sequence, Tuple
+import dijkstra as dij
+import instrumentation as ins
+import route_history as rh
+from csr_graph import CSRGraph
+from mst import WeightedPath
+from weighted_edge import WeightedEdge
+
+INF = float('inf')
+
+
+class ShortestPathTree:
+    '''Shortest path tree from root that is kept up to date while the edge weights change, in the manner of
+    Ramalingam and Reps: update() takes the new weight of every edge number, and only the vertices whose distance
+    can change are searched again. Edges that got heavier on the tree cut off the subtree below them; those
+    vertices start over from their best neighbour outside it, and edges that got lighter seed their heads. A
+    Dijkstra run from these seeds then repairs the tree. If more than max_share of the edges changed, the tree is
+    rebuilt from scratch instead. resettled counts the vertices settled by the last build or update'''
+
+    def __init__(self, g: CSRGraph, root, max_share: float = 0.25, tolerance: float = 0.0) -> None:
+        self.graph: CSRGraph = g.copy()  # the weights the tree is exact for
+        self.root: int = self.graph.index_of(root)
+        self.max_share: float = max_share
+        self.tolerance: float = tolerance  # relative weight changes up to this are not applied
+        n: int = self.graph.vertex_count
+        self.incoming: List[List[int]] = [[] for _ in range(n)]  # positions of the edges into every vertex
+        for pos, v in enumerate(self.graph.targets):
+            self.incoming[v].append(pos)
+        self.by_number: List[int] = [0] * self.graph.edge_count  # CSR position of every edge number
+        for pos, number in enumerate(self.graph.edge_numbers):
+            self.by_number[number] = pos
+        self.distances: List[float] = [INF] * n
+        self.via: List[int] = [-1] * n  # position of the tree edge into every vertex
+        self.resettled: int = 0
+        self.full_runs: int = 0
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        n: int = self.graph.vertex_count
+        self.distances = [INF] * n
+        self.via = [-1] * n
+        self.distances[self.root] = 0.0
+        self.resettled = self._search([(0.0, self.root)])
+        self.full_runs += 1
+
+    # Dijkstra from the seeded heap on the current labels; returns the number of vertices settled
+    def _search(self, heap: List[Tuple[float, int]]) -> int:
+        offsets, targets, weights = self.graph.offsets, self.graph.targets, self.graph.weights
+        distances, via = self.distances, self.via
+        settled: int = 0
+        while heap:
+            dist_u, u = heappop(heap)
+            if dist_u > distances[u]:
+                continue  # stale entry
+            settled += 1
+            for pos in range(offsets[u], offsets[u + 1]):
+                v: int = targets[pos]
+                dist_v: float = dist_u + weights[pos]
+                if dist_v < distances[v]:
+                    distances[v] = dist_v
+                    via[v] = pos
+                    heappush(heap, (dist_v, v))
+        return settled
+
+    '''Takes the new weight of every edge number; applies the changes and repairs the tree. Returns the number of
+    vertices settled again'''
+
+    def update(self, weights: Sequence[float]) -> int:
+        g: CSRGraph = self.graph
+        if len(weights) != g.edge_count:
+            raise ValueError(f"expected {g.edge_count} weights, got {len(weights)}")
+        buffer = g.weights
+        changed: List[Tuple[int, float]] = []  # (position, old weight)
+        for number, weight in enumerate(weights):
+            pos: int = self.by_number[number]
+            old: float = buffer[pos]
+            if weight != old and abs(weight - old) > self.tolerance * abs(old):
+                changed.append((pos, old))
+        if len(changed) > self.max_share * g.edge_count:
+            for pos, _ in changed:
+                buffer[pos] = weights[g.edge_numbers[pos]]
+            self.rebuild()
+            return self.resettled
+        for pos, _ in changed:
+            buffer[pos] = weights[g.edge_numbers[pos]]
+
+        distances, via, tails = self.distances, self.via, g.tails
+        # vertices below a tree edge that got heavier lose their distance
+        children: List[List[int]] = [[] for _ in range(g.vertex_count)]
+        for v, pos in enumerate(via):
+            if pos >= 0:
+                children[tails[pos]].append(v)
+        cut: List[int] = []
+        for pos, old in changed:
+            v: int = g.targets[pos]
+            if buffer[pos] > old and via[v] == pos and distances[v] < INF:
+                stack: List[int] = [v]
+                while stack:
+                    x: int = stack.pop()
+                    if distances[x] == INF:
+                        continue  # already cut
+                    distances[x] = INF
+                    via[x] = -1
+                    cut.append(x)
+                    stack.extend(children[x])
+
+        heap: List[Tuple[float, int]] = []
+        for v in cut:
+            # best way in from a vertex that kept its distance
+            for pos in self.incoming[v]:
+                dist_v: float = distances[tails[pos]] + buffer[pos]
+                if dist_v < distances[v]:
+                    distances[v] = dist_v
+                    via[v] = pos
+            if distances[v] < INF:
+                heappush(heap, (distances[v], v))
+        for pos, old in changed:
+            if buffer[pos] < old:
+                v = g.targets[pos]
+                dist_v = distances[tails[pos]] + buffer[pos]
+                if dist_v < distances[v]:
+                    distances[v] = dist_v
+                    via[v] = pos
+                    heappush(heap, (dist_v, v))
+        self.resettled = self._search(heap)
+        return self.resettled
+
+    def distance(self, target) -> Optional[float]:
+        d: float = self.distances[self.graph.index_of(target)]
+        return None if d == INF else d
+
+    def path(self, target) -> WeightedPath:
+        last: int = self.graph.index_of(target)
+        if self.distances[last] == INF:
+            return []
+        path_dict: Dict[int, WeightedEdge] = {}
+        v: int = last
+        while v != self.root:
+            path_dict[v] = self.graph.edge_at(self.via[v])
+            v = path_dict[v].u
+        return dij.path_dict_to_path(self.root, last, path_dict)
+
+
+'''Takes timestamps in order and the 24 hourly percentage lists; keeps one ShortestPathTree from source over the
+sequence and returns for every timestamp the route to target (vertex names), its weight and the vertices settled
+again, printing how that compares to a full run per timestamp'''
+
+
+def repair_sequence(timestamps, perc, source="94", target="162", max_share=0.25, tolerance=0.0):
+    g = dij.city_graph()
+    tree = None
+    results = []
+    repaired = 0
+    for time in timestamps:
+        weights = dij.edge_weights(time, perc[rh.hour_of(time)])
+        if tree is None:
+            g.update_weights(weights)
+            tree = ShortestPathTree(g, source, max_share, tolerance)
+        else:
+            tree.update(weights)
+        route = [tree.graph.vertex_at(e.u) for e in tree.path(target)] + [target]
+        results.append((route, tree.distance(target), tree.resettled))
+        repaired += tree.resettled
+    full = sum(1 for d in tree.distances if d < INF) * len(timestamps) if tree else 0
+    ins.emit("vertices settled: {} repaired against about {} for full runs; {} full rebuilds of {} timestamps".format(
+        repaired, full, tree.full_runs if tree else 0, len(timestamps)))
+    return results
+
+
+if __name__ == '__main__':
+    import edge_frequency as ef
+    repair_sequence(rh.get_last_day_timestamps(), ef.hourly_counts().percentage_table())
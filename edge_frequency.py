@@ -0,0 +1,133 @@
+from __future__ import annotations
+import csv
+import hashlib
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import edge_index as ei
+import route_history as rh
+import instrumentation as ins
+
+EDGE_COUNT = 1308
+
+
+class HourlyEdgeCounts:
+    '''How often every edge appears in the historical routes of every hour: counts is a (24 x 1308) matrix, routes
+    the number of routes per hour. Routes are added one by one, and for every route csv the byte offset up to which
+    it was consumed is kept with the file's size, mtime and a hash of that prefix, so reading a grown file again only
+    reads and adds the new rows, and a file that shrank or was rewritten is counted again from zero'''
+
+    def __init__(self, edge_count: int = EDGE_COUNT) -> None:
+        self.counts: np.ndarray = np.zeros((24, edge_count), dtype=np.int64)
+        self.routes: np.ndarray = np.zeros(24, dtype=np.int64)
+        self.consumed: Dict[str, Tuple[int, int, int, str]] = {}  # csv path -> (bytes added, size, mtime_ns, sha1)
+
+    '''Takes a route and its timestamp : (['94', '209', ...], '28 Mar 00_09_47') and counts its edges'''
+
+    def add_route(self, route: Sequence, timestamp: str) -> None:
+        hour = rh.hour_of(timestamp)
+        vertices = np.array([int(x) for x in route], dtype=np.intp)
+        numbers = ei.city_edge_index().matrix[vertices[:-1], vertices[1:]]
+        np.add.at(self.counts[hour], numbers[numbers >= 0], 1)
+        self.routes[hour] += 1
+
+    # Add the rows of a route csv (vertices, day, month, time) that were not added before; if a csv that was added
+    # before no longer starts with the rows that were counted, everything is counted again
+    def add_csv(self, path: str) -> None:
+        stat = os.stat(path)
+        offset, size, mtime, digest = self.consumed.get(path, (0, -1, -1, ''))
+        if (size, mtime) == (stat.st_size, stat.st_mtime_ns):
+            return  # unchanged
+        with open(path, 'rb') as f:
+            prefix = hashlib.sha1(f.read(offset))
+        if stat.st_size < offset or (offset > 0 and prefix.hexdigest() != digest):
+            others = [other for other in self.consumed if other != path and os.path.exists(other)]
+            self.counts[:] = 0
+            self.routes[:] = 0
+            self.consumed = {}
+            for other in others:
+                self._consume(other, 0, hashlib.sha1())
+            offset, prefix = 0, hashlib.sha1()
+        self._consume(path, offset, prefix)
+
+    # Add the complete lines of path after offset; prefix is the hash of the bytes before it
+    def _consume(self, path: str, offset: int, prefix) -> None:
+        stat = os.stat(path)
+        rows = 0
+        with ins.stage('edge_counts'), open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # still being written, taken up next time
+                offset += len(line)
+                prefix.update(line)
+                for row in csv.reader([line.decode()]):
+                    if row:
+                        record = rh.parse_row(row)
+                        self.add_route(record.vertices, record.timestamp)
+                        rows += 1
+        self.consumed[path] = (offset, stat.st_size, stat.st_mtime_ns, prefix.hexdigest())
+        ins.count('rows_parsed', rows)
+
+    '''Returns how often each edge appears per route of the hour, rounded to 4 digits, like
+    quan.get_edges_quan_per_hour_percentage'''
+
+    def percentages(self, hour: int) -> List[float]:
+        if self.routes[hour] == 0:
+            return [0.0] * self.counts.shape[1]
+        routes = int(self.routes[hour])
+        return [round(c / routes, 4) for c in self.counts[hour].tolist()]
+
+    def percentage_table(self) -> List[List[float]]:
+        return [self.percentages(hour) for hour in range(24)]
+
+    # Same over the routes of all hours
+    def overall_percentages(self) -> List[float]:
+        total = int(self.routes.sum())
+        if total == 0:
+            return [0.0] * self.counts.shape[1]
+        return [round(c / total, 4) for c in self.counts.sum(axis=0).tolist()]
+
+    def save(self, path: str) -> None:
+        temporary = f"{path}.{os.getpid()}.tmp"  # processes saving at the same time do not collide
+        with open(temporary, 'wb') as f:
+            np.savez(f, counts=self.counts, routes=self.routes,
+                     sources=np.array(list(self.consumed), dtype=str),
+                     consumed=np.array([entry[:3] for entry in self.consumed.values()], dtype=np.int64).reshape(-1, 3),
+                     digests=np.array([entry[3] for entry in self.consumed.values()], dtype=str))
+        os.replace(temporary, path)
+
+    # Files of the older layout without digests load empty, so their sources are counted again
+    @classmethod
+    def load(cls, path: str) -> HourlyEdgeCounts:
+        with np.load(path) as data:
+            counts = cls(data['counts'].shape[1])
+            if 'digests' not in data:
+                return counts
+            counts.counts = data['counts'].copy()
+            counts.routes = data['routes'].copy()
+            counts.consumed = {source: (*consumed, digest) for source, consumed, digest in
+                               zip(data['sources'].tolist(), data['consumed'].tolist(), data['digests'].tolist())}
+        return counts
+
+
+_hourly: Optional[HourlyEdgeCounts] = None
+
+
+'''Returns the shared edge counts over exactly the sources (by default the route history up to the last day): loaded
+from path if it exists, counted again if it holds other sources, brought up to date with the rows the sources got since,
+and saved again when anything was added'''
+
+
+def hourly_counts(path='edge_frequency.npz', sources=(rh.HISTORY,)) -> HourlyEdgeCounts:
+    global _hourly
+    if _hourly is None:
+        _hourly = HourlyEdgeCounts.load(path) if os.path.exists(path) else HourlyEdgeCounts()
+    if set(_hourly.consumed) - set(sources):
+        _hourly = HourlyEdgeCounts()
+    before = dict(_hourly.consumed)
+    for source in sources:
+        _hourly.add_csv(source)
+    if _hourly.consumed != before:
+        _hourly.save(path)
+    return _hourly
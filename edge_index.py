@@ -0,0 +1,70 @@
+from __future__ import annotations
+import csv
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import snapshot as sn
+
+
+class EdgeIndex:
+    '''Maps a (from, to) vertex pair to its edge number. Parallel edges keep the lowest number. With dense=True the
+    numbers live in a vertex_count x vertex_count array (-1 where there is no edge), so a whole route is looked up
+    with one gather; otherwise a dict keyed by (from, to) is used'''
+
+    def __init__(self, pairs: Sequence[Tuple[int, int]], vertex_count: int, dense: bool = False) -> None:
+        self.vertex_count: int = vertex_count
+        self._numbers: Dict[Tuple[int, int], int] = {}
+        for number, pair in enumerate(pairs):
+            self._numbers.setdefault(pair, number)
+        self.matrix: Optional[np.ndarray] = None
+        if dense:
+            self.matrix = np.full((vertex_count, vertex_count), -1, dtype=np.int32)
+            for (u, v), number in self._numbers.items():
+                self.matrix[u, v] = number
+
+    # Read the from/to columns of graph.csv
+    @classmethod
+    def from_csv(cls, path: str = 'graph.csv', dense: bool = False) -> EdgeIndex:
+        with open(path, encoding='utf-8') as f:
+            rows = sorted(csv.DictReader(f), key=lambda row: int(row['edge number']))
+        pairs: List[Tuple[int, int]] = [(int(row['from']), int(row['to'])) for row in rows]
+        vertex_count: int = max(max(u, v) for u, v in pairs) + 1 if pairs else 0
+        return cls(pairs, vertex_count, dense)
+
+    # Take the pairs and the dense matrix of a snapshot instead of parsing graph.csv
+    @classmethod
+    def from_snapshot(cls, snapshot: sn.Snapshot) -> EdgeIndex:
+        index = cls(list(zip(snapshot.tails.tolist(), snapshot.heads.tolist())), snapshot.vertex_count)
+        index.matrix = snapshot.edge_index
+        return index
+
+    def number(self, u: int, v: int) -> int:
+        try:
+            return self._numbers[(u, v)]
+        except KeyError:
+            raise ValueError(f"no edge from {u} to {v}") from None
+
+    # Edge numbers of the consecutive hops of a route of vertex indices
+    def route_numbers(self, route: Sequence[int]) -> np.ndarray:
+        if self.matrix is None:
+            return np.array([self.number(u, v) for u, v in zip(route, route[1:])], dtype=np.int32)
+        route = np.asarray(route, dtype=np.intp)
+        numbers: np.ndarray = self.matrix[route[:-1], route[1:]]
+        if (numbers < 0).any():
+            hop: int = int(np.argmax(numbers < 0))
+            raise ValueError(f"no edge from {route[hop]} to {route[hop + 1]}")
+        return numbers
+
+
+_city_edge_index: Optional[EdgeIndex] = None
+
+
+'''Returns the dense edge index of graph.csv, taken from the city snapshot when there is a fresh one, else built
+from the csv on the first call'''
+
+
+def city_edge_index() -> EdgeIndex:
+    global _city_edge_index
+    if _city_edge_index is None:
+        snapshot = sn.current()
+        _city_edge_index = EdgeIndex.from_csv(dense=True) if snapshot is None else EdgeIndex.from_snapshot(snapshot)
+    return _city_edge_index
@@ -1,39 +1,31 @@
-import dijkstra as dij
+import parallel_routes as par
 import timestamp as ts
-import quantity as quan
+import edge_frequency as ef
+import route_writer as rw
 
 
-'''Returns list with routes from 12 Mai'''
+'''Returns list with routes from 12 Mai; workers > 1 (or None for one per CPU) computes chunks of chunk_size
+timestamps in parallel processes'''
 
 
-def compute_all_routes():
+def compute_all_routes(workers=1, chunk_size=64):
     timestamp = ts.get_timestamp_all()[4267:]  # all timestamps from 12th Mai
-    routes = quan.get_routes_quantity_per_hour()
-    perc = []
-    paths = []
-
-    for i in range(24):
-        percentages = quan.get_edges_quan_per_hour_percentage(routes[i])
-        perc.append(percentages)
-
-    for time in timestamp:
-        ind = int(time.split()[2].split('_')[0])
-        path = dij.dijkstra_1(time, perc[ind])
-        paths.append(path)
-
+    perc = ef.hourly_counts().percentage_table()  # how often the edges appear per hour, kept up to date on disk
+    paths, weights = par.shortest_routes(timestamp, perc, workers=workers, chunk_size=chunk_size)
     return paths
 
 
-'''Creates the routes-last-day.csv file, with all missing routes'''
+'''Creates the routes-last-day.csv file, with all missing routes. The routes are written chunk by chunk as they are
+computed and a checkpoint after every chunk lets a rerun with resume=True continue after the last timestamp written;
+without resume, or once the file is complete, it is written anew. output_format 'binary' writes compact records
+instead (see route_writer)'''
 
 
-def create_csv_last_day_routes():
-    ls = compute_all_routes()
+def create_csv_last_day_routes(workers=1, chunk_size=64, path='routes-last-day.csv', output_format='csv',
+                               resume=False):
     timestamp = ts.get_timestamp_all()[4267:]
-    csv = open('routes-last-day.csv', 'w')
-
-    for i in range(len(ls)):
-        print(ls[i], timestamp[i].split())
-        ls1 = ls[i] + timestamp[i].split()
-        csv.writelines(','.join([str(x) for x in ls1]) + "\n")
-    csv.close()
+    perc = ef.hourly_counts().percentage_table()
+    with rw.RouteSink(path, timestamp, output_format, resume) as sink:
+        for chunk, routes, weights in par.iter_routes(sink.remaining(), perc, workers=workers,
+                                                      chunk_size=chunk_size):
+            sink.write(routes, chunk)
@@ -0,0 +1,53 @@
+import csv
+from array import array
+from math import radians, sin, cos, asin, sqrt
+from typing import List, Optional, Tuple
+from csr_graph import CSRGraph
+
+EARTH_RADIUS = 6371.0  # km
+
+
+'''Takes two (lon, lat) points in degrees; returns the great circle distance between them in km'''
+
+
+def haversine(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lon1, lat1, lon2, lat2 = map(radians, (a[0], a[1], b[0], b[1]))
+    h = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * asin(min(1.0, sqrt(h)))
+
+
+'''Reads the Länge/Breite columns of graph.csv; returns the (lon, lat) of every vertex index, taken from the first
+edge it appears on (None for vertices without edges)'''
+
+
+def vertex_coordinates(path: str = 'graph.csv') -> List[Optional[Tuple[float, float]]]:
+    coordinates = {}
+    with open(path, encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            coordinates.setdefault(int(row['from']), (float(row['Länge/lon1']), float(row['Breite/lat1'])))
+            coordinates.setdefault(int(row['to']), (float(row['Länge/lon2']), float(row['Breite/lat2'])))
+    size = max(coordinates) + 1 if coordinates else 0
+    return [coordinates.get(i) for i in range(size)]
+
+
+'''Returns the straight line length in km of every CSR position of g'''
+
+
+def edge_lengths(g: CSRGraph, coordinates: List[Optional[Tuple[float, float]]]) -> array:
+    return array('d', (haversine(coordinates[u], coordinates[v]) for u, v in zip(g.tails, g.targets)))
+
+
+'''Takes the edge lengths and the current weights of g; returns (speed, slack) such that for every vertex pair
+distance(u, v) >= (haversine(u, v) - slack) / speed: speed is the highest length / weight over the weighted edges,
+slack the total length of the edges with weight 0, which can be crossed for free'''
+
+
+def speed_bound(g: CSRGraph, lengths: array) -> Tuple[float, float]:
+    speed = 0.0
+    slack = 0.0
+    for length, weight in zip(lengths, g.weights):
+        if weight > 0:
+            speed = max(speed, length / weight)
+        else:
+            slack += length
+    return speed, slack
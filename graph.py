@@ -13,7 +13,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import TypeVar, Generic, List, Optional
+from typing import TypeVar, Generic, List, Optional, Dict, Iterable, Tuple
 from edge import Edge
 
 
@@ -25,6 +25,9 @@ class Graph(Generic[V]):
         if vertices is None:
             vertices = []
         self._vertices: List[V] = vertices
+        self._indices: Dict[V, int] = {}  # vertex -> index of its first occurrence
+        for i, vertex in enumerate(vertices):
+            self._indices.setdefault(vertex, i)
         self._edges: List[List[Edge]] = [[] for _ in vertices]
 
     @property
@@ -38,6 +41,7 @@ class Graph(Generic[V]):
     # Add a vertex to the graph and return its index
     def add_vertex(self, vertex: V) -> int:
         self._vertices.append(vertex)
+        self._indices.setdefault(vertex, self.vertex_count - 1)
         self._edges.append([])  # add empty list for containing edges
         return self.vertex_count - 1  # return index of added vertex
 
@@ -53,17 +57,25 @@ class Graph(Generic[V]):
 
     # Add an edge by looking up vertex indices (convenience method)
     def add_edge_by_vertices(self, first: V, second: V) -> None:
-        u: int = self._vertices.index(first)
-        v: int = self._vertices.index(second)
+        u: int = self.index_of(first)
+        v: int = self.index_of(second)
         self.add_edge_by_indices(u, v)
 
+    # Add many edges at once from (first, second) vertex pairs (convenience method)
+    def add_edges_from(self, edges: Iterable[Tuple[V, V]]) -> None:
+        for first, second in edges:
+            self.add_edge_by_indices(self.index_of(first), self.index_of(second))
+
     # Find the vertex at a specific index
     def vertex_at(self, index: int) -> V:
         return self._vertices[index]
 
     # Find the index of a vertex in the graph
     def index_of(self, vertex: V) -> int:
-        return self._vertices.index(vertex)
+        try:
+            return self._indices[vertex]
+        except KeyError:
+            raise ValueError(f"{vertex!r} is not in graph") from None
 
     # Find the vertices that a vertex at some index is connected to
     def neighbors_for_index(self, index: int) -> List[V]:
@@ -0,0 +1,172 @@
+import cProfile
+import os
+import pstats
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+# Off unless enable() is called or ROUTE_INSTRUMENTATION=1 is set; then every stage costs one flag check
+enabled: bool = os.environ.get('ROUTE_INSTRUMENTATION', '') not in ('', '0')
+output: Optional[Callable[..., None]] = print  # where emit() writes, None silences it
+
+timers: Dict[str, List[float]] = {}  # stage -> [calls, total seconds, longest call]
+counters: Dict[str, int] = {}
+profiles: Dict[str, object] = {}  # stage -> pstats.Stats or tracemalloc.Snapshot of its last profiled run
+_hooks: Dict[str, str] = {}  # stage -> 'cprofile' or 'tracemalloc'
+_collectors: List[Callable[[], Dict[str, int]]] = []
+
+
+def enable() -> None:
+    global enabled
+    enabled = True
+
+
+def disable() -> None:
+    global enabled
+    enabled = False
+
+
+def reset() -> None:
+    timers.clear()
+    counters.clear()
+    profiles.clear()
+
+
+'''Replacement for print in the route code; set output to None to silence a bulk run, or to any function that takes
+print's arguments'''
+
+
+def emit(*args) -> None:
+    if output is not None:
+        output(*args)
+
+
+def silence() -> None:
+    global output
+    output = None
+
+
+def count(name: str, n: int = 1) -> None:
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+
+# Adds the fields of a dijkstra.SearchStats to the counters search_pushes, search_pops, ...
+def count_search(stats) -> None:
+    if enabled:
+        for field in ('pushes', 'decreases', 'pops', 'relaxations'):
+            count('search_' + field, getattr(stats, field))
+
+
+# Registers a function that returns counters kept elsewhere (e.g. cache statistics); it is only called when a
+# summary is taken, so those counters cost nothing while running
+def register_collector(collector: Callable[[], Dict[str, int]]) -> None:
+    _collectors.append(collector)
+
+
+# Profile every run of stage with 'cprofile' or 'tracemalloc' (None removes the hook); the result of the last run
+# is kept in profiles[stage]
+def profile(stage: str, kind: Optional[str] = 'cprofile') -> None:
+    if kind is None:
+        _hooks.pop(stage, None)
+    elif kind in ('cprofile', 'tracemalloc'):
+        _hooks[stage] = kind
+    else:
+        raise ValueError(f"kind has to be 'cprofile' or 'tracemalloc', not {kind!r}")
+
+
+@contextmanager
+def _timed_stage(name: str):
+    hook: Optional[str] = _hooks.get(name)
+    profiler: Optional[cProfile.Profile] = None
+    tracing: bool = False
+    if hook == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif hook == 'tracemalloc' and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        tracing = True
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed: float = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            profiles[name] = pstats.Stats(profiler)
+        elif hook == 'tracemalloc' and tracemalloc.is_tracing():
+            profiles[name] = tracemalloc.take_snapshot()
+            if tracing:
+                tracemalloc.stop()
+        entry: List[float] = timers.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+
+
+@contextmanager
+def _nothing():
+    yield
+
+
+'''Context manager that times the block as stage name while instrumentation is enabled'''
+
+
+def stage(name: str):
+    return _timed_stage(name) if enabled else _nothing()
+
+
+'''Decorator form of stage(); the wrapped function runs directly while instrumentation is disabled'''
+
+
+def timed(name: str):
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with _timed_stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+'''Returns {'stages': {name: {'calls', 'seconds', 'max_seconds'}}, 'counters': {name: value}} with the counters of
+the registered collectors merged in'''
+
+
+def summary() -> Dict[str, Dict]:
+    merged: Dict[str, int] = dict(counters)
+    for collector in _collectors:
+        for name, value in collector().items():
+            merged[name] = merged.get(name, 0) + value
+    return {'stages': {name: {'calls': int(calls), 'seconds': total, 'max_seconds': longest}
+                       for name, (calls, total, longest) in timers.items()},
+            'counters': merged}
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+'''Returns the summary in the Prometheus text exposition format'''
+
+
+def prometheus(prefix: str = 'routes') -> str:
+    data = summary()
+    lines: List[str] = []
+    if data['stages']:
+        for metric, key, kind in (('stage_seconds_total', 'seconds', 'counter'),
+                                  ('stage_calls_total', 'calls', 'counter'),
+                                  ('stage_max_seconds', 'max_seconds', 'gauge')):
+            lines.append(f"# TYPE {prefix}_{metric} {kind}")
+            for name, values in sorted(data['stages'].items()):
+                lines.append(f'{prefix}_{metric}{{stage="{name}"}} {values[key]}')
+    for name, value in sorted(data['counters'].items()):
+        metric = f"{prefix}_{_metric_name(name)}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,152 @@
+from heapq import heappush, heappop, nsmallest
+from itertools import count
+from typing import Dict, List, Optional, Set, Tuple, TypeVar
+import dijkstra as dij
+import route_history as rh
+import snapshot as sn
+from csr_graph import CSRGraph
+from mst import WeightedPath
+
+V = TypeVar('V')  # type of the vertices in the graph
+INF = float('inf')
+
+
+'''Yen's algorithm: returns up to k loopless paths from root to target on g, shortest first, as WeightedPaths; paths
+are told apart by their vertices, so of parallel edges only the lightest is used. Every spur search runs on a copy
+of g whose removed edges get the weight inf and stops at the target, see shortest() below. A path is only spurred
+from the vertex where it left the path it was derived from (Lawler), since the spur searches before that vertex are
+the same as for its parent and were done already; the edges that accepted paths take after each root prefix are
+kept in a dict and extended as paths are accepted, instead of being collected again from all accepted paths'''
+
+
+def yen(g: CSRGraph[V], root: V, target: V, k: int,
+        stats: Optional[dij.SearchStats] = None) -> List[WeightedPath]:
+    g = g.copy()  # weights are changed while searching
+    first: int = g.index_of(root)
+    last: int = g.index_of(target)
+    offsets, targets, weights = g.offsets, g.targets, g.weights
+    incoming: List[List[int]] = [[] for _ in range(g.vertex_count)]  # positions of the edges into every vertex
+    for pos, v in enumerate(targets):
+        incoming[v].append(pos)
+
+    # positions of the edge from u to v and its parallel edges
+    def positions_between(u: int, v: int) -> List[int]:
+        return [pos for pos in range(offsets[u], offsets[u + 1]) if targets[pos] == v]
+
+    # One backward search gives the distance of every vertex to the target and its next hop there. Removing edges
+    # only makes distances longer, so these stay a consistent A* estimate for every spur search, and a spur whose
+    # tree path is untouched by the removed edges takes that path without any search
+    to_target, tree = dij.dijkstra_csr(g.reverse(), target)
+    next_hop: List[int] = [-1] * g.vertex_count  # position of the tree edge leaving every vertex
+    for v, edge in tree.items():
+        for pos in positions_between(v, edge.u):
+            if weights[pos] == edge.weight:
+                next_hop[v] = pos
+                break
+
+    def estimate(v: int) -> float:
+        return INF if to_target[v] is None else to_target[v]
+
+    # Follows the tree from v; None if a removed edge or the vertex avoid is in the way
+    def tree_path(v: int, avoid: int) -> Optional[WeightedPath]:
+        hops: WeightedPath = []
+        while v != last:
+            if v == avoid or weights[next_hop[v]] == INF:
+                return None
+            hops.append(g.edge_at(next_hop[v]))
+            v = hops[-1].v
+        return hops
+
+    # Lower bound of the spur path from source: the best first edge plus the tree distance behind it. If the tree
+    # path behind that edge is still open, the bound is met and that path is the spur path, with no search
+    def first_hop(source: int) -> Tuple[float, int]:
+        bound: float = INF
+        best: int = -1
+        for pos in range(offsets[source], offsets[source + 1]):
+            if to_target[targets[pos]] is not None and weights[pos] + to_target[targets[pos]] < bound:
+                bound, best = weights[pos] + to_target[targets[pos]], pos
+        return bound, best
+
+    # The spur path from source whose first hop first_hop() found
+    def spur_path(source: int, pos: int) -> Optional[WeightedPath]:
+        hops: Optional[WeightedPath] = tree_path(targets[pos], source)
+        if hops is not None:
+            return [g.edge_at(pos)] + hops
+        distances, path_dict = dij.heuristic_search(g, g.vertex_at(source), target, estimate, stats)
+        if distances[last] is None or distances[last] == INF:
+            return None
+        return dij.path_dict_to_path(source, last, path_dict)
+
+    def vertices_of(path: WeightedPath) -> List[int]:
+        return [e.u for e in path] + [last]
+
+    blocked: Dict[Tuple[int, ...], Set[int]] = {}  # root prefix -> positions accepted paths take after it
+
+    def accept(path: WeightedPath, deviation: int) -> None:
+        accepted.append(path)
+        deviations.append(deviation)
+        vertices: List[int] = vertices_of(path)
+        for i, edge in enumerate(path):
+            # parallel edges are blocked too: a route is its vertex sequence, so they would only repeat it
+            blocked.setdefault(tuple(vertices[:i + 1]), set()).update(positions_between(edge.u, edge.v))
+
+    if first == last or k < 1:
+        return [[]] if first == last and k >= 1 else []
+    if to_target[first] is None:
+        return []
+    best: WeightedPath = tree_path(first, -1)
+    accepted: List[WeightedPath] = []
+    deviations: List[int] = []  # index of the spur vertex every accepted path was found from
+    accept(best, 0)
+    seen: Set[Tuple[int, ...]] = {tuple(vertices_of(best))}
+    candidates: List[Tuple[float, int, WeightedPath, int]] = []
+    tie = count()
+
+    while len(accepted) < k:
+        path: WeightedPath = accepted[-1]
+        vertices: List[int] = vertices_of(path)
+        root_cost: float = sum(e.weight for e in path[:deviations[-1]])
+        for i in range(deviations[-1], len(path)):
+            removed: Set[int] = set(blocked[tuple(vertices[:i + 1])])
+            for v in vertices[:i]:
+                removed.update(incoming[v])  # the root path's vertices can not be entered again
+            saved: List[Tuple[int, float]] = [(pos, weights[pos]) for pos in removed]
+            for pos in removed:
+                weights[pos] = INF
+            bound, pos = first_hop(vertices[i])
+            spur: Optional[WeightedPath] = None
+            # no search when no spur from here can beat enough candidates to fill up the k paths
+            needed: int = k - len(accepted)
+            if bound < INF and (len(candidates) < needed
+                                or root_cost + bound <= nsmallest(needed, candidates)[-1][0]):
+                spur = spur_path(vertices[i], pos)
+            for pos, weight in saved:
+                weights[pos] = weight
+            if spur is not None:
+                candidate: WeightedPath = path[:i] + spur
+                key = tuple(vertices_of(candidate))
+                if key not in seen:
+                    seen.add(key)
+                    heappush(candidates, (root_cost + sum(e.weight for e in spur), next(tie), candidate, i))
+            root_cost += path[i].weight
+        if not candidates:
+            break
+        cost, _, candidate, deviation = heappop(candidates)
+        accept(candidate, deviation)
+    return accepted
+
+
+'''Takes a timestamp in form of '28 Mr 00_09_47'; returns up to k alternative routes from 94 to 162 as (vertex names,
+total weight) pairs, shortest first, weighted like dijkstra_main (per defaults to the hour's percentages)'''
+
+
+def city_alternatives(timestamp, k=10, per=None):
+    if per is None:
+        per = sn.city_snapshot().hour_percentages(rh.hour_of(timestamp))
+    g = dij.city_graph()
+    g.update_weights(dij.edge_weights(timestamp, per))
+    routes = []
+    for path in yen(g, "94", "162", k):
+        vertices = [g.vertex_at(e.u) for e in path] + ["162"]
+        routes.append((vertices, sum(e.weight for e in path)))
+    return routes
@@ -0,0 +1,223 @@
+from __future__ import annotations
+import hashlib
+import os
+from array import array
+from typing import List, Optional, Sequence, Tuple, Dict
+import dijkstra as dij
+import route_history as rh
+import snapshot as sn
+from csr_graph import CSRGraph
+from weighted_edge import WeightedEdge
+
+MAGIC = b'ALT2'  # file format tag, bump when the layout changes
+INF = float('inf')
+
+
+class Landmarks:
+    '''Distance tables for ALT (A*, landmarks, triangle inequality) on a fixed topology. The tables are computed on
+    lower_bounds, a weight per edge number that no later weight vector undercuts; forward[i * n + v] is the distance
+    from landmark i to vertex v and backward[i * n + v] the distance from v to landmark i (inf if unreachable).
+    fingerprint identifies the graph the tables belong to, see graph_fingerprint()'''
+
+    def __init__(self, vertex_count: int, landmarks: List[int], lower_bounds: array, forward: array,
+                 backward: array, fingerprint: int = 0) -> None:
+        self.vertex_count: int = vertex_count
+        self.fingerprint: int = fingerprint
+        self.landmarks: List[int] = landmarks
+        self.lower_bounds: array = lower_bounds
+        self.forward: array = forward
+        self.backward: array = backward
+
+    # Pick k landmarks by farthest selection: every new landmark is the vertex farthest (to plus from) from the
+    # landmarks chosen so far, then fill the distance tables
+    @classmethod
+    def build(cls, g: CSRGraph, lower_bounds: Sequence[float], k: int = 8, start: int = 0) -> Landmarks:
+        g = g.copy()  # leave the weights of the caller's graph alone
+        reverse: CSRGraph = g.reverse()
+        g.update_weights(lower_bounds)
+        reverse.update_weights(lower_bounds)
+        n: int = g.vertex_count
+        forward: array = array('d')
+        backward: array = array('d')
+        landmarks: List[int] = []
+        closest: List[float] = [INF] * n  # smallest distance to or from any landmark so far
+        candidate: int = start
+        for _ in range(min(k, n)):
+            landmarks.append(candidate)
+            from_landmark = dij.dijkstra_csr(g, g.vertex_at(candidate))[0]
+            to_landmark = dij.dijkstra_csr(reverse, g.vertex_at(candidate))[0]
+            forward.extend(INF if d is None else d for d in from_landmark)
+            backward.extend(INF if d is None else d for d in to_landmark)
+            for v in range(n):
+                # distance in either direction; vertices the landmark can not reach or be reached from are skipped
+                known = [d for d in (from_landmark[v], to_landmark[v]) if d is not None]
+                if known:
+                    closest[v] = min(closest[v], sum(known))
+            reachable = [v for v in range(n) if closest[v] < INF and v not in landmarks]
+            if not reachable:
+                break
+            candidate = max(reachable, key=lambda v: closest[v])
+        return cls(n, landmarks, array('d', lower_bounds), forward, backward, graph_fingerprint(g))
+
+    # Lower bound of the distance from v to t under any weights that are >= lower_bounds
+    def bound(self, v: int, t: int) -> float:
+        n: int = self.vertex_count
+        best: float = 0.0
+        for i in range(len(self.landmarks)):
+            to_t, to_v = self.forward[i * n + t], self.forward[i * n + v]
+            if to_t < INF and to_v < INF:
+                best = max(best, to_t - to_v)  # d(L, t) <= d(L, v) + d(v, t)
+            from_v, from_t = self.backward[i * n + v], self.backward[i * n + t]
+            if from_v < INF and from_t < INF:
+                best = max(best, from_v - from_t)  # d(v, L) <= d(v, t) + d(t, L)
+        return best
+
+    # True if the tables belong to the topology of g and every weight of g is at least the lower bound they were
+    # built with
+    def valid_for(self, g: CSRGraph) -> bool:
+        return self.matches(g) and \
+            all(weight >= self.lower_bounds[number] for weight, number in zip(g.weights, g.edge_numbers))
+
+    def matches(self, g: CSRGraph) -> bool:
+        return self.fingerprint == graph_fingerprint(g)
+
+    def save(self, path: str) -> None:
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(MAGIC)
+            array('q', [self.vertex_count, len(self.landmarks), len(self.lower_bounds), self.fingerprint]).tofile(f)
+            array('q', self.landmarks).tofile(f)
+            self.lower_bounds.tofile(f)
+            self.forward.tofile(f)
+            self.backward.tofile(f)
+        os.replace(temporary, path)
+
+    # Read tables saved by save(); with g given, tables that were built for another graph raise ValueError, since
+    # their bounds would not be lower bounds on it
+    @classmethod
+    def load(cls, path: str, g: Optional[CSRGraph] = None) -> Landmarks:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a landmark file of this version")
+            header: array = array('q')
+            header.fromfile(f, 4)
+            vertex_count, k, edge_count, fingerprint = header
+            landmarks: array = array('q')
+            landmarks.fromfile(f, k)
+            tables: List[array] = []
+            for size in (edge_count, k * vertex_count, k * vertex_count):
+                table: array = array('d')
+                table.fromfile(f, size)
+                tables.append(table)
+        result = cls(vertex_count, list(landmarks), *tables, fingerprint=fingerprint)
+        if g is not None and not result.matches(g):
+            raise ValueError(f"{path} was built for another graph")
+        return result
+
+
+'''Returns a 63 bit hash of the vertex count and the (tail, head) of every edge number of g'''
+
+
+def graph_fingerprint(g: CSRGraph) -> int:
+    by_number: List[Tuple[int, int]] = [(0, 0)] * g.edge_count
+    for pos, number in enumerate(g.edge_numbers):
+        by_number[number] = (g.tails[pos], g.targets[pos])
+    digest = hashlib.sha1(repr((g.vertex_count, by_number)).encode()).digest()
+    return int.from_bytes(digest[:8], 'little') >> 1
+
+
+'''A* from root to target on g with the landmark bounds as heuristic; if the current weights of g undercut the
+lower bounds the tables were built with, the bounds are not safe and it falls back to dijkstra_csr with early exit'''
+
+
+def alt(g: CSRGraph, root, target, tables: Landmarks,
+        stats: Optional[dij.SearchStats] = None) -> Tuple[List[Optional[float]], Dict[int, WeightedEdge]]:
+    if not tables.valid_for(g):
+        return dij.dijkstra_csr(g, root, stats, target=target)
+    last: int = g.index_of(target)
+    estimates: List[Optional[float]] = [None] * g.vertex_count
+
+    def estimate(v: int) -> float:
+        if estimates[v] is None:
+            estimates[v] = tables.bound(v, last)
+        return estimates[v]
+
+    return dij.heuristic_search(g, root, target, estimate, stats)
+
+
+'''Takes timestamps and the 24 hourly percentage lists; returns the smallest weight of every edge over all those
+timestamps, a lower bound for the weights dijkstra_1 uses at any of them'''
+
+
+def lower_bound_weights(timestamps, perc):
+    bounds = None
+    for time in timestamps:
+        ind = rh.hour_of(time)
+        weights = dij.edge_weights(time, perc[ind])
+        bounds = weights if bounds is None else [min(a, b) for a, b in zip(bounds, weights)]
+    return bounds
+
+
+'''Builds landmark tables for the city graph from the lower bound weights of the given timestamps and saves them to
+path; the topology is fixed, so the file only has to be rebuilt when the bounds change'''
+
+
+def build_city_landmarks(timestamps, perc, k=8, path='landmarks.alt'):
+    tables = Landmarks.build(dij.city_graph(), lower_bound_weights(timestamps, perc), k)
+    tables.save(path)
+    return tables
+
+
+_city_landmarks: Optional[Landmarks] = None
+
+
+'''Returns the landmark tables of the city graph from path; when the file is missing or belongs to another graph they
+are built over the lower bounds of all timestamps with the hourly percentages and saved first'''
+
+
+def city_landmarks(path: str = 'landmarks.alt', k: int = 8) -> Landmarks:
+    global _city_landmarks
+    if _city_landmarks is None:
+        g = dij.city_graph()
+        try:
+            _city_landmarks = Landmarks.load(path, g)
+        except (OSError, ValueError, EOFError):
+            import timestamp as ts
+            _city_landmarks = build_city_landmarks(ts.get_timestamp_all(), sn.city_snapshot().percentages.tolist(),
+                                                   k, path)
+    return _city_landmarks
+
+
+'''The search dijkstra_1 and dijkstra_main use when dij.use_landmarks is set: ALT on the city landmarks if their
+bounds hold for the current weights of g, the bidirectional search otherwise'''
+
+
+def route_search(g: CSRGraph, reverse: CSRGraph, root, target,
+                 stats: Optional[dij.SearchStats] = None) -> Tuple[List[Optional[float]], Dict[int, WeightedEdge]]:
+    tables = city_landmarks()
+    if tables.valid_for(g):
+        return alt(g, root, target, tables, stats)
+    return dij.bidirectional_dijkstra(g, reverse, root, target, stats)
+
+
+'''Same results as batch_routes.shortest_routes, one ALT search per timestamp'''
+
+
+def shortest_routes(timestamps, perc, source="94", target="162", graph=None):
+    g: CSRGraph = dij.city_graph() if graph is None else graph
+    g = g.copy()
+    reverse: CSRGraph = g.reverse()
+    first, last = g.index_of(source), g.index_of(target)
+    routes, weights = [], []
+    for time in timestamps:
+        edge_weights = dij.edge_weights(time, perc[rh.hour_of(time)])
+        g.update_weights(edge_weights)
+        reverse.update_weights(edge_weights)
+        distances, path_dict = route_search(g, reverse, source, target)
+        if distances[last] is None:
+            routes.append([])
+        else:
+            path = dij.path_dict_to_path(first, last, path_dict) if first != last else []
+            routes.append([g.vertex_at(e.u) for e in path] + [target])
+        weights.append(float('inf') if distances[last] is None else distances[last])
+    return routes, weights
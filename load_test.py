@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+import route_history as rh
+
+
+async def _request(reader, writer, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    status = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    body = await reader.readexactly(length)
+    if b' 200 ' not in status:
+        raise RuntimeError(f"{status.decode().strip()}: {body.decode()}")
+    return json.loads(body)
+
+
+def _percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+'''Sends every (source, target, timestamp) query of queries to the service, over concurrency keep-alive connections
+(TCP host:port, or the Unix socket unix_path); returns the latencies in seconds and the throughput per second'''
+
+
+async def run_load(queries, concurrency=16, host='127.0.0.1', port=8080, unix_path=None):
+    pending = list(enumerate(queries))
+    latencies = [0.0] * len(queries)
+
+    async def client():
+        if unix_path is None:
+            reader, writer = await asyncio.open_connection(host, port)
+        else:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        try:
+            while pending:
+                i, (source, target, timestamp) = pending.pop()
+                start = time.perf_counter()
+                await _request(reader, writer, f"/route?source={source}&target={target}&timestamp={quote(timestamp)}")
+                latencies[i] = time.perf_counter() - start
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, len(queries) / (time.perf_counter() - start)
+
+
+'''Seconds a fresh process needs to import dijkstra and answer one dijkstra_main query, the cost main.py pays per
+run; the minimum of runs'''
+
+
+def cold_start_seconds(timestamp, runs=3):
+    code = f"import instrumentation as ins; ins.silence(); import dijkstra as dij; dij.dijkstra_main({timestamp!r})"
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+
+'''Queries 94 -> 162 at every timestamp of the last day, repeat times over (so later rounds hit the cache), prints
+p50/p99 latency and throughput next to the cold start of a single process and returns them'''
+
+
+def load_test(repeat=3, concurrency=16, host='127.0.0.1', port=8080, unix_path=None, timestamps=None):
+    if timestamps is None:
+        timestamps = rh.get_last_day_timestamps()
+    queries = [("94", "162", t) for t in timestamps] * repeat
+    latencies, throughput = asyncio.run(run_load(queries, concurrency, host, port, unix_path))
+    result = {'queries': len(queries), 'p50_seconds': _percentile(latencies, 0.5),
+              'p99_seconds': _percentile(latencies, 0.99), 'throughput_per_second': throughput,
+              'cold_start_seconds': cold_start_seconds(timestamps[0])}
+    print("{queries} queries  p50 {p50_seconds:.4f} s  p99 {p99_seconds:.4f} s  {throughput_per_second:.1f}/s  "
+          "cold start of one process {cold_start_seconds:.3f} s".format(**result))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test for route_service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--unix', help='connect to this Unix socket instead of TCP')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    load_test(args.repeat, args.concurrency, args.host, args.port, args.unix)
@@ -13,12 +13,15 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import TypeVar, List, Optional
-import duration as dur
+from typing import TypeVar, List, Optional, Tuple
+import numpy as np
+import duration_cache as dc
 from weighted_graph import WeightedGraph
 from weighted_edge import WeightedEdge
 from priority_queue import PriorityQueue
-import connection as con
+import edge_index as ei
+import snapshot as sn
+import instrumentation as ins
 
 
 V = TypeVar('V')  # type of the vertices in the graph
@@ -56,16 +59,125 @@ def mst(wg: WeightedGraph[V], start: int = 0) -> Optional[WeightedPath]:
     return result
 
 
-'''Returns the duration of the dijkstra computed route; Input: (['94', '209', ...], '28 Mar 00_09_27')'''
+class DisjointSet:
+    '''Union-find over the indices 0 .. size - 1 with path compression and union by rank'''
+
+    def __init__(self, size: int) -> None:
+        self.parent: List[int] = list(range(size))
+        self.rank: List[int] = [0] * size
+
+    # Root of the set of x; every index on the way is pointed straight at the root
+    def find(self, x: int) -> int:
+        root: int = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    # Merge the sets of x and y, the lower tree goes below the higher; False if they were one set already
+    def union(self, x: int, y: int) -> bool:
+        x, y = self.find(x), self.find(y)
+        if x == y:
+            return False
+        if self.rank[x] < self.rank[y]:
+            x, y = y, x
+        self.parent[y] = x
+        if self.rank[x] == self.rank[y]:
+            self.rank[x] += 1
+        return True
+
+
+# Kruskal's algorithm: the edges are taken in order of weight (ties in edge order) and kept if they join two
+# trees. Edge directions are ignored, and unlike mst() every component is covered, so for a disconnected graph the
+# result is a minimum spanning forest
+def kruskal(wg: WeightedGraph[V]) -> WeightedPath:
+    edges: List[WeightedEdge] = [edge for i in range(wg.vertex_count) for edge in wg.edges_for_index(i)]
+    weights: np.ndarray = np.array([edge.weight for edge in edges], dtype=np.float64)
+    sets: DisjointSet = DisjointSet(wg.vertex_count)
+    result: WeightedPath = []
+    for i in np.argsort(weights, kind='stable').tolist():
+        edge: WeightedEdge = edges[i]
+        if sets.union(edge.u, edge.v):
+            result.append(edge)
+            if len(result) == wg.vertex_count - 1:
+                break  # one tree spans everything
+    return result
 
 
+# Weight and number of components of the minimum spanning forest for every row of weights (one weight per edge
+# number; edge i joins tails[i] and heads[i], direction ignored). All rows are solved together with Boruvka's
+# algorithm: every round each component picks its lightest outgoing edge (ties by edge number, as in kruskal()),
+# so after at most log2(vertex_count) rounds of array operations every component is spanned
+def forest_weights(tails, heads, weights, vertex_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    tails = np.asarray(tails, dtype=np.intp)
+    heads = np.asarray(heads, dtype=np.intp)
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    rows, m = weights.shape
+    order: np.ndarray = np.argsort(weights, axis=1, kind='stable')
+    rank: np.ndarray = np.empty_like(order)  # position of every edge in its row's order, a strict total order
+    np.put_along_axis(rank, order, np.broadcast_to(np.arange(m), order.shape), axis=1)
+    labels: np.ndarray = np.tile(np.arange(vertex_count), (rows, 1))  # component of every vertex
+    chosen: np.ndarray = np.zeros((rows, m), dtype=bool)
+    base: np.ndarray = (np.arange(rows) * vertex_count)[:, None]
+    while True:
+        cu, cv = labels[:, tails], labels[:, heads]
+        key: np.ndarray = np.where(cu != cv, rank, m)  # m marks edges inside a component
+        if (key == m).all():
+            break
+        best: np.ndarray = np.full(rows * vertex_count, m, dtype=order.dtype)
+        np.minimum.at(best, (base + cu).ravel(), key.ravel())
+        np.minimum.at(best, (base + cv).ravel(), key.ravel())
+        r, c = np.nonzero(best.reshape(rows, vertex_count) < m)
+        e: np.ndarray = order[r, best[r * vertex_count + c]]
+        chosen[r, e] = True
+        other: np.ndarray = np.where(labels[r, tails[e]] == c, labels[r, heads[e]], labels[r, tails[e]])
+        parent: np.ndarray = np.tile(np.arange(vertex_count), (rows, 1))
+        parent[r, c] = other
+        # two components that picked the same edge point at each other; the smaller label becomes the root
+        mutual: np.ndarray = (parent[r, other] == c) & (c < other)
+        parent[r[mutual], c[mutual]] = c[mutual]
+        while True:
+            jumped: np.ndarray = np.take_along_axis(parent, parent, axis=1)
+            if (jumped == parent).all():
+                break
+            parent = jumped
+        labels = np.take_along_axis(parent, labels, axis=1)
+    return np.where(chosen, weights, 0.0).sum(axis=1), vertex_count - chosen.sum(axis=1)
+
+
+# Weight and number of components of the minimum spanning forest of the city graph under the predicted durations
+# of every timestamp, chunk_size timestamps at a time
+def backbone_weights(timestamps: List[str], chunk_size: int = 512) -> Tuple[np.ndarray, np.ndarray]:
+    snapshot: sn.Snapshot = sn.city_snapshot()
+    totals: List[np.ndarray] = []
+    components: List[np.ndarray] = []
+    for i in range(0, len(timestamps), chunk_size):
+        weights = np.array([dc.get_edges_predicted_duration(t) for t in timestamps[i:i + chunk_size]])
+        total, count = forest_weights(snapshot.tails, snapshot.heads, weights, snapshot.vertex_count)
+        totals.append(total)
+        components.append(count)
+    if not totals:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    return np.concatenate(totals), np.concatenate(components)
+
+
+'''Returns the duration of the dijkstra computed route; Input: (['94', '209', ...], '28 Mar 00_09_27') or the
+WeightedPath of the route instead of its vertices. A WeightedPath is summed over the edge numbers it took, a list of
+vertices over the lowest numbered edge between consecutive vertices'''
+
+
+@ins.timed('route_duration')
 def get_route_duration(ls, timestamp):
-    data = dur.get_edges_predicted_duration_new(timestamp)
-    summe = 0
-    for i in range(len(ls)-1):
-        dic = con.get_connection(str(ls[i]), str(ls[i+1]))
-        num = dic.get("number")
-        summe += float(data[int(num)])
+    if ls and isinstance(ls[0], WeightedEdge):
+        if all(e.number >= 0 for e in ls):
+            numbers = [e.number for e in ls]
+        else:  # edges that do not come from the graph, like unpacked shortcuts
+            numbers = ei.city_edge_index().route_numbers([e.u for e in ls] + [ls[-1].v])
+    else:
+        numbers = ei.city_edge_index().route_numbers([int(x) for x in ls])
+    data = np.asarray(dc.get_edges_predicted_duration(timestamp), dtype=np.float64)
+    summe = sum(data[numbers].tolist(), 0)  # added hop by hop, like the durations always were
     t = float(round((round(summe, 2) - int(round(summe, 2))) * 60)) / 100 + int(round(summe, 2))
     return t
 
@@ -75,6 +187,7 @@ def print_weighted_path(wg: WeightedGraph, wp: WeightedPath, timestamp):
     for edge in wp:
         route.append(str(wg.vertex_at(edge.u)))
     route.append('162')
-    print("Route: ", route)
-    print("Total Duration In Minutes: ", get_route_duration(route, timestamp))
-    return get_route_duration(route, timestamp)
+    route_duration = get_route_duration(wp, timestamp)
+    ins.emit("Route: ", route)
+    ins.emit("Total Duration In Minutes: ", route_duration)
+    return route_duration
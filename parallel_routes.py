@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import batch_routes as br
+import dijkstra as dij
+
+_graph = None  # topology and hourly percentages, sent to every worker process once
+_perc = None
+
+
+def _init_worker(graph, perc):
+    global _graph, _perc
+    _graph = graph
+    _perc = perc
+
+
+def _routes_for_chunk(timestamps, source, target):
+    return br.shortest_routes(timestamps, _perc, source, target, graph=_graph)
+
+
+'''Yields (timestamps, routes, weights) for consecutive chunks of chunk_size timestamps as soon as each chunk is
+done, in timestamp order; with workers > 1 (or None for one per CPU) the chunks are computed on a process pool'''
+
+
+def iter_routes(timestamps, perc, source="94", target="162", workers=1, chunk_size=64):
+    chunks = [timestamps[i:i + chunk_size] for i in range(0, len(timestamps), chunk_size)]
+    if workers == 1:
+        for chunk in chunks:
+            yield (chunk,) + br.shortest_routes(chunk, perc, source, target)
+        return
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(dij.city_graph(), perc)) as executor:
+        results = executor.map(_routes_for_chunk, chunks, repeat(source), repeat(target))
+        for chunk, (chunk_routes, chunk_weights) in zip(chunks, results):
+            yield chunk, chunk_routes, chunk_weights
+
+
+'''Same as batch_routes.shortest_routes, but with workers > 1 (or None for one per CPU) the timestamps are split into
+chunks of chunk_size and fanned out over a process pool; routes and weights come back in timestamp order'''
+
+
+def shortest_routes(timestamps, perc, source="94", target="162", workers=1, chunk_size=64):
+    if workers == 1:
+        return br.shortest_routes(timestamps, perc, source, target, chunk_size=chunk_size)
+
+    routes = []
+    weights = []
+    for chunk, chunk_routes, chunk_weights in iter_routes(timestamps, perc, source, target, workers, chunk_size):
+        routes += chunk_routes
+        weights += chunk_weights
+    return routes, weights
+
+
+'''Returns [func(*args) for args in zip(*iterables)], computed on a process pool when workers is not 1; func has to
+be a module level function so the workers can import it'''
+
+
+def parallel_map(func, *iterables, workers=1, chunk_size=64):
+    if workers == 1:
+        return list(map(func, *iterables))
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(func, *iterables, chunksize=chunk_size))
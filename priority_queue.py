@@ -13,7 +13,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import TypeVar, Generic, List
+from typing import TypeVar, Generic, List, Tuple
 from heapq import heappush, heappop
 
 
@@ -36,3 +36,89 @@ class PriorityQueue(Generic[T]):
 
     def __repr__(self) -> str:
         return repr(self._container)
+
+
+# Binary heap of the integers 0 .. capacity - 1 that knows where every item sits,
+# so an item's priority can be lowered in place instead of pushing a duplicate
+class IndexedPriorityQueue:
+    def __init__(self, capacity: int) -> None:
+        self._heap: List[int] = []  # items in heap order
+        self._positions: List[int] = [-1] * capacity  # index of each item in _heap, -1 if absent
+        self._priorities: List[float] = [0.0] * capacity
+
+    @property
+    def empty(self) -> bool:
+        return not self._heap
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def contains(self, item: int) -> bool:
+        return self._positions[item] >= 0
+
+    __contains__ = contains
+
+    def priority(self, item: int) -> float:
+        return self._priorities[item]
+
+    def push(self, item: int, priority: float) -> None:
+        if self._positions[item] >= 0:
+            raise ValueError(f"{item} is already in the queue")
+        self._heap.append(item)
+        self._positions[item] = len(self._heap) - 1
+        self._priorities[item] = priority
+        self._sift_up(len(self._heap) - 1)
+
+    def decrease_key(self, item: int, priority: float) -> None:
+        if priority > self._priorities[item]:
+            raise ValueError(f"new priority {priority} is larger than {self._priorities[item]}")
+        self._priorities[item] = priority
+        self._sift_up(self._positions[item])
+
+    # Remove the item with the lowest priority and return it with its priority
+    def pop(self) -> Tuple[int, float]:
+        heap: List[int] = self._heap
+        top: int = heap[0]
+        last: int = heap.pop()
+        self._positions[top] = -1
+        if heap:
+            heap[0] = last
+            self._positions[last] = 0
+            self._sift_down(0)
+        return top, self._priorities[top]
+
+    def _sift_up(self, index: int) -> None:
+        heap, positions, priorities = self._heap, self._positions, self._priorities
+        item: int = heap[index]
+        priority: float = priorities[item]
+        while index > 0:
+            parent: int = (index - 1) >> 1
+            if priorities[heap[parent]] <= priority:
+                break
+            heap[index] = heap[parent]
+            positions[heap[index]] = index
+            index = parent
+        heap[index] = item
+        positions[item] = index
+
+    def _sift_down(self, index: int) -> None:
+        heap, positions, priorities = self._heap, self._positions, self._priorities
+        size: int = len(heap)
+        item: int = heap[index]
+        priority: float = priorities[item]
+        while True:
+            child: int = 2 * index + 1
+            if child >= size:
+                break
+            if child + 1 < size and priorities[heap[child + 1]] < priorities[heap[child]]:
+                child += 1
+            if priorities[heap[child]] >= priority:
+                break
+            heap[index] = heap[child]
+            positions[heap[index]] = index
+            index = child
+        heap[index] = item
+        positions[item] = index
+
+    def __repr__(self) -> str:
+        return repr([(item, self._priorities[item]) for item in self._heap])
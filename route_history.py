@@ -0,0 +1,179 @@
+from __future__ import annotations
+import csv
+import os
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Sequence
+import numpy as np
+import instrumentation as ins
+
+# month tokens of the route csvs (padded with spaces in the files); the history carries no year
+MONTHS = {'Jan': 1, 'Feb': 2, 'Mr': 3, 'Mrz': 3, 'Mär': 3, 'Apr': 4, 'Mai': 5, 'Jun': 6, 'Jul': 7, 'Aug': 8,
+          'Sep': 9, 'Okt': 10, 'Nov': 11, 'Dez': 12}
+MONTH_TOKENS = {1: 'Jan', 2: 'Feb', 3: 'Mr', 4: 'Apr', 5: 'Mai', 6: 'Jun', 7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Okt',
+                11: 'Nov', 12: 'Dez'}
+YEAR = 1900
+# the route history up to the last day; the percentages and similarities of validate_d.txt are computed over it
+HISTORY = 'route-all-missing-last-day.csv'
+EPOCH = datetime(YEAR, 1, 1)
+MAGIC = b'RTS1'  # cache file format tag, bump when the layout changes
+
+
+@dataclass
+class RouteRecord:
+    vertices: array  # array('H') of vertex ids
+    time: datetime
+    hour: int
+
+    # The timestamp in form of '28 Mr 00_09_47', as the other modules use it
+    @property
+    def timestamp(self) -> str:
+        return format_timestamp(self.time)
+
+
+def format_timestamp(time: datetime) -> str:
+    return f"{time.day} {MONTH_TOKENS[time.month]} {time:%H_%M_%S}"
+
+
+'''Takes one csv row (vertex ids..., day, month, HH_MM_SS); returns it parsed as a RouteRecord'''
+
+
+def parse_row(row: Sequence[str]) -> RouteRecord:
+    time = parse_timestamp(' '.join(x.strip() for x in row[-3:]))
+    return RouteRecord(array('H', (int(x) for x in row[:-3])), time, time.hour)
+
+
+'''Takes a timestamp in form of '28 Mr 00_09_47'; returns it as datetime'''
+
+
+def parse_timestamp(timestamp: str) -> datetime:
+    day, month, clock = timestamp.split()
+    hour, minute, second = (int(x) for x in clock.split('_'))
+    return datetime(YEAR, MONTHS[month], int(day), hour, minute, second)
+
+
+'''Takes a timestamp in form of '28 Mr 00_09_47'; returns its hour, the index of the hourly percentages and counts'''
+
+
+def hour_of(timestamp: str) -> int:
+    return int(timestamp.split()[2].split('_')[0])
+
+
+'''Yields the rows of a route csv such as route-all.csv one by one as RouteRecords'''
+
+
+def read_routes(path: str = 'route-all.csv') -> Iterator[RouteRecord]:
+    rows = 0
+    try:
+        with open(path, newline='') as f:
+            for row in csv.reader(f):
+                if row:
+                    rows += 1
+                    yield parse_row(row)
+    finally:
+        ins.count('rows_parsed', rows)
+
+
+'''Returns the timestamps of routes-last-day.csv in form of '12 Mai 00_09_12', in file order'''
+
+
+def get_last_day_timestamps(path: str = 'routes-last-day.csv') -> List[str]:
+    with open(path, newline='') as f:
+        return [' '.join(x.strip() for x in row[-3:]) for row in csv.reader(f) if row]
+
+
+class RouteTable:
+    '''Columnar route history: the vertices of route i are vertices[offsets[i]:offsets[i + 1]], times holds the
+    seconds since EPOCH and hours the hour of every route. Loaded from a cache file the columns are memory-mapped'''
+
+    def __init__(self, offsets: np.ndarray, vertices: np.ndarray, times: np.ndarray, hours: np.ndarray) -> None:
+        self.offsets: np.ndarray = offsets
+        self.vertices: np.ndarray = vertices
+        self.times: np.ndarray = times
+        self.hours: np.ndarray = hours
+
+    @classmethod
+    def from_records(cls, records: Iterator[RouteRecord]) -> RouteTable:
+        offsets: array = array('q', [0])
+        vertices: array = array('H')
+        times: array = array('q')
+        hours: array = array('B')
+        for record in records:
+            vertices.extend(record.vertices)
+            offsets.append(len(vertices))
+            times.append(int((record.time - EPOCH).total_seconds()))
+            hours.append(record.hour)
+        return cls(np.frombuffer(offsets, dtype=np.int64), np.frombuffer(vertices, dtype=np.uint16),
+                   np.frombuffer(times, dtype=np.int64), np.frombuffer(hours, dtype=np.uint8))
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def route(self, i: int) -> np.ndarray:
+        return self.vertices[self.offsets[i]:self.offsets[i + 1]]
+
+    def time(self, i: int) -> datetime:
+        return EPOCH + timedelta(seconds=int(self.times[i]))
+
+    def record(self, i: int) -> RouteRecord:
+        return RouteRecord(array('H', self.route(i).tolist()), self.time(i), int(self.hours[i]))
+
+    def timestamps(self) -> List[str]:
+        return [format_timestamp(self.time(i)) for i in range(len(self))]
+
+    # Routes as lists of vertex names grouped by hour, like quan.get_routes_quantity_per_hour()
+    def routes_per_hour(self) -> List[List[List[str]]]:
+        groups: List[List[List[str]]] = [[] for _ in range(24)]
+        for i, hour in enumerate(self.hours.tolist()):
+            groups[hour].append([str(v) for v in self.route(i).tolist()])
+        return groups
+
+    # Layout: MAGIC, int64 header (source size, source mtime_ns, routes, vertices), offsets, times (int64),
+    # vertices (uint16), hours (uint8)
+    def save(self, path: str, source_size: int = -1, source_mtime: int = -1) -> None:
+        temporary = f"{path}.{os.getpid()}.tmp"  # processes building at the same time do not collide
+        with open(temporary, 'wb') as f:
+            f.write(MAGIC)
+            np.array([source_size, source_mtime, len(self), len(self.vertices)], dtype=np.int64).tofile(f)
+            np.asarray(self.offsets, dtype=np.int64).tofile(f)
+            np.asarray(self.times, dtype=np.int64).tofile(f)
+            np.asarray(self.vertices, dtype=np.uint16).tofile(f)
+            np.asarray(self.hours, dtype=np.uint8).tofile(f)
+        os.replace(temporary, path)  # readers never map a half written file
+
+    # Memory-map a cache file; returns None if it is missing, not a cache file or was built from another source
+    @classmethod
+    def load(cls, path: str, source_size: int = -1, source_mtime: int = -1) -> Optional[RouteTable]:
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            size, mtime, routes, vertices = np.fromfile(f, dtype=np.int64, count=4).tolist()
+        if (size, mtime) != (source_size, source_mtime):
+            return None
+        start = len(MAGIC) + 4 * 8
+        columns = []
+        for dtype, count in ((np.int64, routes + 1), (np.int64, routes), (np.uint16, vertices), (np.uint8, routes)):
+            # np.memmap can not map zero bytes
+            columns.append(np.memmap(path, dtype=dtype, mode='r', offset=start, shape=(count,)) if count
+                           else np.zeros(0, dtype=dtype))
+            start += count * np.dtype(dtype).itemsize
+        offsets, times, vertex_ids, hours = columns
+        return cls(offsets, vertex_ids, times, hours)
+
+
+'''Returns the RouteTable of a route csv, memory-mapped from <path>.bin when that cache was built from the current
+file; otherwise the csv is parsed once and, with cache=True, the cache file is written'''
+
+
+def load_table(path: str = 'route-all.csv', cache: bool = True) -> RouteTable:
+    stat = os.stat(path)
+    table = RouteTable.load(path + '.bin', stat.st_size, stat.st_mtime_ns) if cache else None
+    if table is None:
+        with ins.stage('route_table'):
+            table = RouteTable.from_records(read_routes(path))
+            if cache:
+                table.save(path + '.bin', stat.st_size, stat.st_mtime_ns)
+    return table
@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import json
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import dijkstra as dij
+import instrumentation as ins
+import mst
+import route_history as rh
+import snapshot as sn
+
+
+def _init_worker():
+    # load everything a query needs once per worker process, and keep the route prints out of the service log
+    ins.silence()
+    dij.city_graph()
+    dij.city_graph_reversed()
+    sn.city_snapshot()
+
+
+'''Runs in a worker process. Takes source and target vertex names and a timestamp in form of '28 Mr 00_09_47';
+returns {'route', 'weight', 'duration'} for the route dijkstra_main would take between them (route [] and weight and
+duration None if there is none)'''
+
+
+def answer(source, target, timestamp):
+    per = sn.city_snapshot().hour_percentages(rh.hour_of(timestamp))
+    weights = dij.edge_weights(timestamp, per)
+    g = dij.city_graph()
+    reverse = dij.city_graph_reversed()
+    g.update_weights(weights)
+    reverse.update_weights(weights)
+    first, last = g.index_of(source), g.index_of(target)
+    distances, path_dict = dij.bidirectional_dijkstra(g, reverse, source, target)
+    if distances[last] is None:
+        return {'route': [], 'weight': None, 'duration': None}
+    path = dij.path_dict_to_path(first, last, path_dict) if first != last else []
+    route = [g.vertex_at(e.u) for e in path] + [target]
+    return {'route': route, 'weight': distances[last], 'duration': mst.get_route_duration(route, timestamp)}
+
+
+class ComputationCancelled(Exception):
+    '''The computation a query waited for was cancelled (e.g. the pool shut down), not the query itself'''
+
+
+class RouteService:
+    '''asyncio front end for answer(): searches run on a process pool whose workers keep the graph, the snapshot and
+    their duration cache in memory. Queries for the same (source, target, timestamp) that arrive while one is being
+    computed wait for that one, and the last cache_size answers are kept in an LRU. Every caller waits through
+    asyncio.shield, so a caller that is cancelled leaves the computation running for the others'''
+
+    def __init__(self, workers: Optional[int] = None, cache_size: int = 4096) -> None:
+        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(workers, initializer=_init_worker)
+        self.cache_size: int = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self.counts: Dict[str, int] = {'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'computed': 0, 'errors': 0}
+
+    async def query(self, source: str, target: str, timestamp: str) -> dict:
+        key = (source, target, timestamp)
+        self.counts['requests'] += 1
+        if key in self._cache:
+            self.counts['cache_hits'] += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.counts['coalesced'] += 1
+        else:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, answer, source, target, timestamp)
+            self._in_flight[key] = future
+            future.add_done_callback(partial(self._finished, key))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if future.cancelled():
+                raise ComputationCancelled(f'the computation of {key} was cancelled') from None
+            raise
+
+    # Done callback of the computation for key, whoever of its callers is still waiting: it leaves _in_flight and its
+    # answer goes into the cache
+    def _finished(self, key: Tuple[str, str, str], future: asyncio.Future) -> None:
+        del self._in_flight[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.counts['computed'] += 1
+        self._cache[key] = future.result()
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    # GET /route?source=94&target=162&timestamp=12 Mai 00_09_12 and GET /metrics, HTTP/1.1 with keep-alive
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                status, body = await self.respond(request_line.decode('latin-1').split())
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                payload = json.dumps(body).encode()
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(payload)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, request) -> Tuple[str, dict]:
+        if len(request) < 2 or request[0] != 'GET':
+            return '405 Method Not Allowed', {'error': 'only GET is supported'}
+        url = urlsplit(request[1])
+        if url.path == '/metrics':
+            return '200 OK', dict(self.counts, cached=len(self._cache), in_flight=len(self._in_flight))
+        if url.path != '/route':
+            return '404 Not Found', {'error': f'unknown path {url.path}'}
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        # CancelledError is left alone: it means this request's own task is cancelled, and handle closes the connection
+        try:
+            return '200 OK', await self.query(query.get('source', '94'), query.get('target', '162'),
+                                              query['timestamp'])
+        except (KeyError, ValueError, IndexError) as e:
+            self.counts['errors'] += 1
+            return '400 Bad Request', {'error': f'bad query: {e!r}'}
+        except ComputationCancelled as e:
+            self.counts['errors'] += 1
+            return '503 Service Unavailable', {'error': str(e)}
+        except Exception as e:
+            self.counts['errors'] += 1
+            return '500 Internal Server Error', {'error': repr(e)}
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+
+'''Serves routes on host:port, or on a Unix socket if unix_path is given, until cancelled'''
+
+
+async def serve(host='127.0.0.1', port=8080, unix_path=None, workers=None, cache_size=4096):
+    sn.city_snapshot()  # build a missing or stale snapshot once, before the workers map it
+    service = RouteService(workers, cache_size)
+    if unix_path is None:
+        server = await asyncio.start_server(service.handle, host, port)
+    else:
+        server = await asyncio.start_unix_server(service.handle, unix_path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Route query service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--unix', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--cache-size', type=int, default=4096)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.cache_size))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,144 @@
+import json
+import os
+import struct
+import sys
+from array import array
+from datetime import timedelta
+from typing import Iterator, List, Optional, Sequence
+import route_history as rh
+
+RECORD_HEADER = struct.Struct('<qH')  # seconds since rh.EPOCH, number of vertices
+
+
+class CsvRouteWriter:
+    '''Writes rows like routes-last-day.csv: the vertices of the route followed by day, month and time'''
+
+    def __init__(self, path: str, append: bool) -> None:
+        self._file = open(path, 'a' if append else 'w', newline='')
+
+    def write(self, routes: Sequence[Sequence], timestamps: Sequence[str]) -> None:
+        self._file.writelines(','.join([str(x) for x in list(route) + timestamp.split()]) + '\n'
+                              for route, timestamp in zip(routes, timestamps))
+
+    def flush(self) -> int:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class BinaryRouteWriter:
+    '''Writes every route as a little endian record: int64 seconds since route_history.EPOCH, uint16 number of
+    vertices, uint16 vertex ids; read it back with read_binary_routes'''
+
+    def __init__(self, path: str, append: bool) -> None:
+        self._file = open(path, 'ab' if append else 'wb')
+
+    def write(self, routes: Sequence[Sequence], timestamps: Sequence[str]) -> None:
+        chunks: List[bytes] = []
+        for route, timestamp in zip(routes, timestamps):
+            seconds = int((rh.parse_timestamp(timestamp) - rh.EPOCH).total_seconds())
+            vertices = array('H', (int(x) for x in route))  # OverflowError for ids above 65535
+            if sys.byteorder == 'big':
+                vertices.byteswap()
+            chunks.append(RECORD_HEADER.pack(seconds, len(vertices)))
+            chunks.append(vertices.tobytes())
+        self._file.write(b''.join(chunks))
+
+    def flush(self) -> int:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+FORMATS = {'csv': CsvRouteWriter, 'binary': BinaryRouteWriter}
+
+
+'''Yields the records of a file written by BinaryRouteWriter'''
+
+
+def read_binary_routes(path: str) -> Iterator[rh.RouteRecord]:
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            seconds, count = RECORD_HEADER.unpack(header)
+            vertices = array('H')
+            vertices.frombytes(f.read(2 * count))
+            if sys.byteorder == 'big':
+                vertices.byteswap()
+            time = rh.EPOCH + timedelta(seconds=seconds)
+            yield rh.RouteRecord(vertices, time, time.hour)
+
+
+class RouteSink:
+    '''Writes the routes of timestamps to path in the given format, batch by batch, and records after every batch,
+    in <path>.checkpoint, the target timestamps, the last one written and the file size at that point; the checkpoint
+    is removed once the last timestamp is written. Opened with resume=True after a crash for the same timestamps it
+    cuts off a half written batch and remaining() skips the timestamps that are already in the file; otherwise the
+    file is written anew'''
+
+    def __init__(self, path: str, timestamps: Sequence[str], output_format: str = 'csv',
+                 resume: bool = False) -> None:
+        if output_format not in FORMATS:
+            raise ValueError(f"unknown output format {output_format!r}, expected one of {sorted(FORMATS)}")
+        self.path = path
+        self.checkpoint_path = path + '.checkpoint'
+        self.timestamps: List[str] = list(timestamps)
+        self.last: Optional[str] = None  # last timestamp written
+        self.rows = 0
+        size = 0
+        if resume and os.path.exists(self.checkpoint_path) and os.path.exists(path):
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('format') == output_format and checkpoint.get('range') == self._range() \
+                    and checkpoint['timestamp'] in self.timestamps:
+                self.last, self.rows, size = checkpoint['timestamp'], checkpoint['rows'], checkpoint['bytes']
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+        self.output_format = output_format
+        self._writer = FORMATS[output_format](path, append=size > 0)
+
+    # first and last target timestamp and how many there are, to tell the checkpoint of another run apart
+    def _range(self) -> List:
+        if not self.timestamps:
+            return [None, None, 0]
+        return [self.timestamps[0], self.timestamps[-1], len(self.timestamps)]
+
+    # The target timestamps that come after the checkpoint
+    def remaining(self) -> List[str]:
+        if self.last is None:
+            return list(self.timestamps)
+        return self.timestamps[self.timestamps.index(self.last) + 1:]
+
+    def write(self, routes: Sequence[Sequence], timestamps: Sequence[str]) -> None:
+        if not timestamps:
+            return
+        self._writer.write(routes, timestamps)
+        size = self._writer.flush()
+        self.last = timestamps[-1]
+        self.rows += len(timestamps)
+        if self.last == self.timestamps[-1]:
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)  # complete, a rerun starts over
+            return
+        temporary = self.checkpoint_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'timestamp': self.last, 'rows': self.rows, 'bytes': size, 'format': self.output_format,
+                       'range': self._range()}, f)
+        os.replace(temporary, self.checkpoint_path)
+
+    def close(self) -> None:
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,65 @@
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import edge_index as ei
+import route_history as rh
+import instrumentation as ins
+
+VERTEX_COUNT = 538
+EDGE_COUNT = 1308
+
+
+class SimilarityIndex:
+    '''Historical routes grouped by hour as rows of a 0/1 incidence matrix, over the vertices (by='vertex') or the
+    edge numbers (by='edge') of each route. A candidate route is scored against every route of an hour with one
+    matrix-vector product: its share of vertices/edges that also appear in the historical route'''
+
+    def __init__(self, routes_per_hour: Sequence[Sequence[Sequence]], by: str = 'vertex',
+                 threshold: float = 0.75) -> None:
+        if by not in ('vertex', 'edge'):
+            raise ValueError(f"by has to be 'vertex' or 'edge', not {by!r}")
+        self.by: str = by
+        self.threshold: float = threshold
+        self.size: int = VERTEX_COUNT if by == 'vertex' else EDGE_COUNT
+        self.matrices: List[np.ndarray] = []
+        for routes in routes_per_hour:
+            matrix = np.zeros((len(routes), self.size), dtype=np.uint8)
+            for row, route in enumerate(routes):
+                matrix[row, self._items(route)] = 1
+            self.matrices.append(matrix)
+
+    # Vertex indices or edge numbers of a route given as vertex names; hops that are no edge are left out
+    def _items(self, route: Sequence) -> np.ndarray:
+        vertices = np.array([int(x) for x in route], dtype=np.intp)
+        if self.by == 'vertex':
+            return vertices
+        numbers = ei.city_edge_index().matrix[vertices[:-1], vertices[1:]]
+        return numbers[numbers >= 0]
+
+    '''Takes a route and a timestamp : (['94', '209', ...], '28 Mar 00_09_47'); returns for every historical route
+    of the same hour the share of the route's vertices (edges) found in it'''
+
+    def ratios(self, route: Sequence, timestamp: str) -> np.ndarray:
+        items = self._items(route)
+        counts = np.bincount(items, minlength=self.size)  # a vertex visited twice counts twice, as in similar()
+        return (self.matrices[rh.hour_of(timestamp)] @ counts) / len(items)
+
+    '''Returns the share of historical routes of the same hour the route is at least threshold similar with'''
+
+    @ins.timed('similarity')
+    def score(self, route: Sequence, timestamp: str, threshold: Optional[float] = None) -> float:
+        threshold = self.threshold if threshold is None else threshold
+        ratios = self.ratios(route, timestamp)
+        return int(np.count_nonzero(ratios >= threshold)) / len(ratios)
+
+
+_hourly: Dict[str, SimilarityIndex] = {}
+
+
+'''Returns the SimilarityIndex over the routes of route-all-missing-last-day.csv grouped by hour, the history the
+similarities of validate_d.txt are taken against; built once per process and mode'''
+
+
+def hourly_index(by: str = 'vertex') -> SimilarityIndex:
+    if by not in _hourly:
+        _hourly[by] = SimilarityIndex(rh.load_table(rh.HISTORY).routes_per_hour(), by)
+    return _hourly[by]
@@ -0,0 +1,141 @@
+from __future__ import annotations
+import csv
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+
+MAGIC = b'SNAP'
+VERSION = 2  # bump when the layout or the sources change; files of another version are rebuilt
+SOURCES = ('graph.csv', 'route-all-missing-last-day.csv')  # the graph and route_history.HISTORY
+
+
+class Snapshot:
+    '''The parsed city data in one file: edge number i goes from tails[i] to heads[i], coordinates holds the
+    (lon, lat) of every vertex index (nan for vertices without edges), edge_index the dense from x to matrix of edge
+    numbers (-1 where there is no edge) and percentages the (24 x edges) table of how often every edge appears in
+    the routes of an hour. Loaded from disk every column is memory-mapped, so only the pages used are read'''
+
+    def __init__(self, tails: np.ndarray, heads: np.ndarray, coordinates: np.ndarray, edge_index: np.ndarray,
+                 percentages: np.ndarray, sources: Tuple[Tuple[int, int], ...] = ()) -> None:
+        self.tails: np.ndarray = tails
+        self.heads: np.ndarray = heads
+        self.coordinates: np.ndarray = coordinates
+        self.edge_index: np.ndarray = edge_index
+        self.percentages: np.ndarray = percentages
+        self.sources: Tuple[Tuple[int, int], ...] = sources  # (size, mtime_ns) of SOURCES when it was built
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self.coordinates)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.tails)
+
+    # Parse graph.csv and take the hourly percentages from edge_frequency
+    @classmethod
+    def build(cls, graph_path: str = SOURCES[0], route_path: str = SOURCES[1]) -> Snapshot:
+        import edge_frequency as ef
+        import geo
+        with open(graph_path, encoding='utf-8') as f:
+            rows = sorted(csv.DictReader(f), key=lambda row: int(row['edge number']))
+        tails = np.array([int(row['from']) for row in rows], dtype=np.int32)
+        heads = np.array([int(row['to']) for row in rows], dtype=np.int32)
+        coordinates = np.array([(np.nan, np.nan) if c is None else c for c in geo.vertex_coordinates(graph_path)],
+                               dtype=np.float64).reshape(-1, 2)
+        edge_index = np.full((len(coordinates), len(coordinates)), -1, dtype=np.int32)
+        edge_index[tails[::-1], heads[::-1]] = np.arange(len(tails) - 1, -1, -1, dtype=np.int32)  # lowest wins
+        percentages = np.array(ef.hourly_counts(sources=(route_path,)).percentage_table(), dtype=np.float64)
+        return cls(tails, heads, coordinates, edge_index, percentages, source_stats((graph_path, route_path)))
+
+    # Layout: MAGIC, int64 header (VERSION, vertices, edges, then size and mtime_ns of every source), tails and
+    # heads (int32), coordinates (float64), edge_index (int32), percentages (float64), all C order
+    def save(self, path: str) -> None:
+        header = [VERSION, self.vertex_count, self.edge_count] + [x for stat in self.sources for x in stat]
+        temporary = f"{path}.{os.getpid()}.tmp"  # processes building at the same time do not collide
+        with open(temporary, 'wb') as f:
+            f.write(MAGIC)
+            np.array(header, dtype=np.int64).tofile(f)
+            for column in (self.tails, self.heads, self.edge_index):
+                np.ascontiguousarray(column, dtype=np.int32).tofile(f)
+            for column in (self.coordinates, self.percentages):
+                np.ascontiguousarray(column, dtype=np.float64).tofile(f)
+        os.replace(temporary, path)  # workers that have the old file mapped keep reading it
+
+    # Memory-map a snapshot; returns None if it is missing or of another version
+    @classmethod
+    def load(cls, path: str) -> Optional[Snapshot]:
+        if not os.path.exists(path):
+            return None
+        header_size = 3 + 2 * len(SOURCES)
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            header = np.fromfile(f, dtype=np.int64, count=header_size).tolist()
+        if len(header) < header_size or header[0] != VERSION:
+            return None
+        vertices, edges = header[1], header[2]
+        sources = tuple((header[i], header[i + 1]) for i in range(3, header_size, 2))
+        start = len(MAGIC) + 8 * header_size
+        columns = []
+        for dtype, shape in ((np.int32, (edges,)), (np.int32, (edges,)), (np.int32, (vertices, vertices)),
+                             (np.float64, (vertices, 2)), (np.float64, (24, edges))):
+            columns.append(np.memmap(path, dtype=dtype, mode='r', offset=start, shape=shape))
+            start += int(np.prod(shape)) * np.dtype(dtype).itemsize
+        tails, heads, edge_index, coordinates, percentages = columns
+        return cls(tails, heads, coordinates, edge_index, percentages, sources)
+
+    # True if none of the source files that still exist changed since the snapshot was built
+    def fresh(self, paths=SOURCES) -> bool:
+        return all(current is None or current == stat
+                   for current, stat in zip(source_stats(paths, missing=None), self.sources))
+
+    # The (lon, lat) of every vertex index as geo.vertex_coordinates returns them
+    def vertex_coordinates(self) -> List[Optional[Tuple[float, float]]]:
+        return [None if np.isnan(lon) else (lon, lat) for lon, lat in self.coordinates.tolist()]
+
+    # The percentages of one hour as a list, as hp.perc[hour]
+    def hour_percentages(self, hour: int) -> List[float]:
+        return self.percentages[hour].tolist()
+
+
+def source_stats(paths, missing=(-1, -1)):
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stats.append((stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            stats.append(missing)
+    return tuple(stats)
+
+
+_snapshot: Optional[Snapshot] = None
+
+
+'''Returns the snapshot in path if it exists and is fresh, without building one; None otherwise'''
+
+
+def current(path: str = 'city.snap') -> Optional[Snapshot]:
+    global _snapshot
+    if _snapshot is None:
+        snapshot = Snapshot.load(path)
+        if snapshot is not None and snapshot.fresh():
+            _snapshot = snapshot
+    return _snapshot
+
+
+'''Returns the city snapshot, memory-mapped from path; it is built and saved first when the file is missing, of an
+older version, or graph.csv / route-all-missing-last-day.csv changed since'''
+
+
+def city_snapshot(path: str = 'city.snap') -> Snapshot:
+    global _snapshot
+    if current(path) is None:
+        Snapshot.build().save(path)
+        _snapshot = Snapshot.load(path)
+    return _snapshot
+
+
+if __name__ == "__main__":
+    Snapshot.build().save('city.snap')
@@ -0,0 +1,32 @@
+from csr_graph import CSRGraph
+from weighted_graph import WeightedGraph
+
+VERTICES = ['a', 'b', 'c', 'd']
+# tails out of order, so edge numbers and CSR positions differ
+EDGES = [(2, 3, 1.0), (0, 1, 2.0), (1, 2, 3.0), (0, 2, 4.0), (3, 0, 5.0), (0, 1, 6.0)]
+NEW_WEIGHTS = [10.0, 20.0, 30.0, 40.0, 50.0, 60.0]
+
+
+def adjacency(g):
+    return [sorted((e.v, e.weight, e.number) for e in g.edges_for_index(i)) for i in range(g.vertex_count)]
+
+
+def test_to_weighted_graph_stays_equal_after_update_weights():
+    g = CSRGraph.from_edges(VERTICES, EDGES)
+    wg = g.to_weighted_graph()
+    assert adjacency(wg) == adjacency(g)
+    g.update_weights(NEW_WEIGHTS)
+    wg.update_weights(NEW_WEIGHTS)
+    assert adjacency(wg) == adjacency(g)
+    assert adjacency(CSRGraph.from_weighted_graph(wg)) == adjacency(g)
+
+
+def test_from_weighted_graph_stays_equal_after_update_weights():
+    wg = WeightedGraph(list(VERTICES))
+    for u, v, weight in EDGES:
+        wg.add_edge_by_indices(u, v, weight)
+    g = CSRGraph.from_weighted_graph(wg)
+    g.update_weights(NEW_WEIGHTS)
+    wg.update_weights(NEW_WEIGHTS)
+    assert [sorted((e.v, e.weight) for e in wg.edges_for_index(i)) for i in range(wg.vertex_count)] == \
+        [sorted((e.v, e.weight) for e in g.edges_for_index(i)) for i in range(g.vertex_count)]
@@ -0,0 +1,39 @@
+import dijkstra as dij
+from csr_graph import CSRGraph
+
+A, B, C, T = range(4)
+
+
+# A -> B -> C is shorter than A -> C, but C is reached first when the bound of B is higher than the one of C
+def inconsistent_graph():
+    return CSRGraph.from_edges(['A', 'B', 'C', 'T'], [(A, B, 0.1), (A, C, 0.15), (B, C, 0.0), (C, T, 1.0)])
+
+
+def route(path_dict):
+    return [e.u for e in dij.path_dict_to_path(A, T, path_dict)] + [T]
+
+
+def test_heuristic_search_reopens_settled_vertices():
+    g = inconsistent_graph()
+    bounds = {A: 0.0, B: 1.0, C: 0.0, T: 0.0}  # admissible, but not consistent on B -> C
+    distances, path_dict = dij.heuristic_search(g, 'A', 'T', bounds.__getitem__)
+    assert distances[T] == 1.1
+    assert route(path_dict) == [A, B, C, T]
+
+
+def test_astar_with_free_edge():
+    g = inconsistent_graph()
+    # on one meridian: T, C, B and A 0.01 degrees apart, so the bound of B exceeds the one of C by more than 0.05
+    coordinates = [(0.0, 0.03), (0.0, 0.02), (0.0, 0.01), (0.0, 0.0)]
+    distances, path_dict = dij.astar(g, 'A', 'T', coordinates)
+    assert distances[T] == dij.dijkstra_csr(g, 'A')[0][T] == 1.1
+    assert route(path_dict) == [A, B, C, T]
+
+
+# the second of two parallel edges is the lighter one, so the path has to name it by its number
+def test_paths_keep_edge_numbers():
+    g = CSRGraph.from_edges(['A', 'B', 'C', 'T'], [(A, B, 2.0), (A, B, 1.0), (B, T, 1.0), (A, C, 5.0), (C, T, 1.0)])
+    _, path_dict = dij.dijkstra_csr(g, 'A')
+    assert [e.number for e in dij.path_dict_to_path(A, T, path_dict)] == [1, 2]
+    _, path_dict = dij.bidirectional_dijkstra(g, g.reverse(), 'A', 'T')
+    assert [e.number for e in dij.path_dict_to_path(A, T, path_dict)] == [1, 2]
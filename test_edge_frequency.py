@@ -0,0 +1,28 @@
+import ast
+import edge_frequency as ef
+import route_history as rh
+
+
+# validate_d_1.py runs its validation when imported, so the hard-coded per list is read from its source
+def validate_d_1_per():
+    with open('validate_d_1.py', encoding='utf-8') as f:
+        for node in ast.walk(ast.parse(f.read())):
+            if isinstance(node, ast.Assign) and any(getattr(t, 'id', None) == 'per' for t in node.targets):
+                return ast.literal_eval(node.value)
+    raise AssertionError('no per list in validate_d_1.py')
+
+
+def test_overall_percentages_match_validate_d_1():
+    counts = ef.HourlyEdgeCounts()
+    counts.add_csv(rh.HISTORY)
+    assert counts.overall_percentages() == validate_d_1_per()
+
+
+def test_hourly_counts_default_to_the_history(tmp_path):
+    ef._hourly = None
+    try:
+        counts = ef.hourly_counts(str(tmp_path / 'edge_frequency.npz'))
+        assert list(counts.consumed) == [rh.HISTORY]
+        assert counts.overall_percentages() == validate_d_1_per()
+    finally:
+        ef._hourly = None
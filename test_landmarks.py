@@ -0,0 +1,31 @@
+import pytest
+import dijkstra as dij
+import landmarks as lm
+from csr_graph import CSRGraph
+
+
+EDGES = [(0, 1, 2.0), (1, 2, 2.0), (0, 3, 1.0), (3, 4, 1.0), (4, 2, 1.5), (2, 0, 3.0), (4, 1, 0.5)]
+
+
+def grid_graph():
+    return CSRGraph.from_edges(['a', 'b', 'c', 'd', 'e'], EDGES)
+
+
+def test_alt_matches_dijkstra():
+    g = grid_graph()
+    tables = lm.Landmarks.build(g, [0.5] * g.edge_count, k=2)
+    for target in ['a', 'b', 'c', 'd', 'e']:
+        distances, _ = lm.alt(g, 'a', target, tables)
+        assert distances[g.index_of(target)] == dij.dijkstra_csr(g, 'a')[0][g.index_of(target)]
+
+
+def test_load_rejects_tables_of_another_graph(tmp_path):
+    g = grid_graph()
+    path = str(tmp_path / 'landmarks.alt')
+    lm.Landmarks.build(g, [0.5] * g.edge_count, k=2).save(path)
+    assert lm.Landmarks.load(path, g).valid_for(g)
+    # same vertex and edge count, every edge turned around
+    other = CSRGraph.from_edges(['a', 'b', 'c', 'd', 'e'], [(v, u, w) for u, v, w in EDGES])
+    assert not lm.Landmarks.load(path).valid_for(other)
+    with pytest.raises(ValueError):
+        lm.Landmarks.load(path, other)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+from heapq import heappush, heappop
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import duration_cache as dc
+import route_history as rh
+from csr_graph import CSRGraph
+from weighted_edge import WeightedEdge
+
+
+'''Takes a timestamp in form of '28 Mr 00_09_47'; returns it as minutes since route_history.EPOCH'''
+
+
+def minutes(timestamp: str) -> float:
+    return (rh.parse_timestamp(timestamp) - rh.EPOCH).total_seconds() / 60
+
+
+class DurationTable:
+    '''Predicted duration in minutes of every edge number at every time slot: durations[i, n] holds for the slot
+    starting at times[i] (minutes since route_history.EPOCH, ascending). Between two slots the duration is
+    interpolated linearly and outside the first/last slot it is held constant.
+
+    A duration that falls by more than the time between two slots would let a later departure arrive earlier. The
+    table is made FIFO when it is built: durations[i] becomes min(durations[i], gap + durations[i + 1]), computed
+    backwards over the slots, i.e. waiting for the next slot is never better than going now. Then every slope is at
+    least -1, so with the linear interpolation arrival time never decreases with departure time'''
+
+    def __init__(self, times: np.ndarray, durations: np.ndarray) -> None:
+        self.times: np.ndarray = times
+        self.durations: np.ndarray = durations
+        self._rows: Dict[int, List[float]] = {}  # slot -> durations as a list, filled while searching
+
+    @classmethod
+    def build(cls, timestamps: Sequence[str]) -> DurationTable:
+        by_time: Dict[float, str] = {minutes(t): t for t in timestamps}
+        times = np.array(sorted(by_time), dtype=np.float64)
+        durations = np.array([dc.get_edges_predicted_duration(by_time[t]) for t in times.tolist()],
+                             dtype=np.float64)
+        for i in range(len(times) - 2, -1, -1):
+            np.minimum(durations[i], times[i + 1] - times[i] + durations[i + 1], out=durations[i])
+        return cls(times, durations)
+
+    def row(self, slot: int) -> List[float]:
+        durations = self._rows.get(slot)
+        if durations is None:
+            durations = self._rows[slot] = self.durations[slot].tolist()
+        return durations
+
+    # Slots around time t and the weight of the later one: duration = (1 - share) * row(slot) + share * row(next)
+    def locate(self, t: float) -> Tuple[int, int, float]:
+        slot = int(np.searchsorted(self.times, t, side='right')) - 1
+        if slot < 0:
+            return 0, 0, 0.0
+        if slot >= len(self.times) - 1:
+            return slot, slot, 0.0
+        return slot, slot + 1, (t - self.times[slot]) / (self.times[slot + 1] - self.times[slot])
+
+    def duration(self, number: int, t: float) -> float:
+        slot, after, share = self.locate(t)
+        return (1 - share) * self.row(slot)[number] + share * self.row(after)[number]
+
+
+# Earliest arrival search: the label of a vertex is the time it is reached, and an edge left at time t costs its
+# duration at t, scaled by scale[number] if given (a factor in [0, 1] keeps the table FIFO). Since the table is FIFO,
+# arriving earlier at a vertex is never worse, so the Dijkstra invariant holds. Returns the arrival time at every
+# vertex (None if unreached) and the path_dict with the duration each edge took as its weight
+def td_dijkstra(g: CSRGraph, table: DurationTable, root, departure: float, target=None,
+                scale: Optional[Sequence[float]] = None) -> Tuple[List[Optional[float]], Dict[int, WeightedEdge]]:
+    offsets, targets, numbers = g.offsets, g.targets, g.edge_numbers
+    first: int = g.index_of(root)
+    last: int = -1 if target is None else g.index_of(target)
+    arrivals: List[Optional[float]] = [None] * g.vertex_count
+    arrivals[first] = departure
+    via: List[int] = [-1] * g.vertex_count
+    taken: Dict[int, float] = {}  # vertex -> duration of the edge it was reached over
+    heap: List[Tuple[float, int]] = [(departure, first)]
+
+    while heap:
+        t, u = heappop(heap)
+        if t > arrivals[u]:
+            continue  # stale entry
+        if u == last:
+            break
+        slot, after, share = table.locate(t)
+        now, later = table.row(slot), table.row(after)
+        for pos in range(offsets[u], offsets[u + 1]):
+            number: int = numbers[pos]
+            duration: float = (1 - share) * now[number] + share * later[number]
+            if scale is not None:
+                duration *= scale[number]
+            v: int = targets[pos]
+            if arrivals[v] is None or arrivals[v] > t + duration:
+                arrivals[v] = t + duration
+                via[v] = pos
+                taken[v] = duration
+                heappush(heap, (t + duration, v))
+
+    path_dict: Dict[int, WeightedEdge] = {v: WeightedEdge(g.tails[pos], targets[pos], taken[v], g.edge_numbers[pos])
+                                          for v, pos in enumerate(via) if pos >= 0}
+    return arrivals, path_dict
+
+
+# Time it takes to drive the route (vertex indices) when leaving at departure, every edge priced at the time it is
+# reached; parallel edges take the quickest one
+def travel_time(g: CSRGraph, table: DurationTable, route: Sequence[int], departure: float,
+                scale: Optional[Sequence[float]] = None) -> float:
+    t: float = departure
+    for u, v in zip(route, route[1:]):
+        durations = [table.duration(g.edge_numbers[pos], t) * (1.0 if scale is None else scale[g.edge_numbers[pos]])
+                     for pos in range(g.offsets[u], g.offsets[u + 1]) if g.targets[pos] == v]
+        if not durations:
+            raise ValueError(f"no edge from {u} to {v}")
+        t += min(durations)
+    return t - departure
+
+
+_city_table: Optional[DurationTable] = None
+
+
+'''Returns the DurationTable over all timestamps of timestamp.get_timestamp_all(), built on the first call'''
+
+
+def city_duration_table() -> DurationTable:
+    global _city_table
+    if _city_table is None:
+        import timestamp as ts
+        _city_table = DurationTable.build(ts.get_timestamp_all())
+    return _city_table
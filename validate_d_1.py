@@ -1,19 +1,13 @@
 import dijkstra as dij
 import quantity as quan
-import connection as con
 import test
+import similarity as sim
+import edge_frequency as ef
+import route_history as rh
 
 
-def similar(ls_0, hour):
-    counter = 0
-    summe = 0
-    for route in test.get_timestamp_route_list(hour):
-        dup = [x for x in ls_0 if x in route]
-        summe += len(dup)/len(ls_0)
-        if len(dup)/len(ls_0) >= 0.75:
-            counter += 1
-
-    return counter/len(test.get_timestamp_route_list(hour))
+def similar(ls_0, hour, threshold=0.75):
+    return sim.hourly_index().score(ls_0, hour, threshold)
 
 
 def get_timestamp_route_list(timestamp):
@@ -31,22 +25,7 @@ def get_timestamp_route_list(timestamp):
 
 
 def get_edges_quan_per_hour_per(timestamp):
-    routes = get_timestamp_route_list(timestamp)
-    edges = []
-    counter = []
-
-    for i in range(len(routes)):
-        for j in range(1, len(routes[i])):
-            dic = con.get_connection(routes[i][j - 1], routes[i][j])
-            num = dic.get('number')
-            edges.append(int(num))
-
-    for i in range(1308):
-        c = edges.count(i)
-        per = c / len(routes)
-        counter.append(round(per, 4))
-
-    return counter
+    return ef.hourly_counts().percentages(rh.hour_of(timestamp))
 
 
 def get_seventy_five_percent_similarity_percent():
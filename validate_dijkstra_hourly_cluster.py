@@ -1,39 +1,27 @@
-import dijkstra as dij
+import parallel_routes as par
 import timestamp as ts
-import quantity as quan
+import edge_frequency as ef
+import similarity as sim
 
 '''Takes a route and timestamp : (['94', '209', ...], '28 Mar 00_09_47'); returns percentage, where route matches 75% 
 or above with historical routes taken in the same hour'''
 
 
-def similar(ls_0, hour):
-    counter = 0
-    summe = 0
-    for route in ts.get_timestamp_route_list(hour):
-        dup = [x for x in ls_0 if x in route]
-        summe += len(dup)/len(ls_0)
-        if len(dup)/len(ls_0) >= 0.75:
-            counter += 1
-    return counter/len(ts.get_timestamp_route_list(hour))
+def similar(ls_0, hour, threshold=0.75):
+    return sim.hourly_index().score(ls_0, hour, threshold)
 
 
 '''Returns list with percentages, that show with how many historical routes the calculated route is 75% similar with;
-Similarity is a hourly cluster, percentage how often the edge was found in historical routes'''
+Similarity is a hourly cluster, percentage how often the edge was found in historical routes;
+workers > 1 (or None for one per CPU) computes chunks of chunk_size timestamps in parallel processes'''
 
 
-def get_seventy_five_percent_similarity_percent():
+def get_seventy_five_percent_similarity_percent(workers=1, chunk_size=64):
     timestamp = ts.get_timestamp_all()  # [4267:]
     paths = []
-    routes = quan.get_routes_quantity_per_hour()
-    perc = []
+    perc = ef.hourly_counts().percentage_table()
 
-    for i in range(24):
-        percentages = quan.get_edges_quan_per_hour_percentage(routes[i])
-        perc.append(percentages)
-
-    for time in timestamp:
-        ind = int(time.split()[2].split('_')[0])
-        path = dij.dijkstra_1(time, perc[ind])
-        paths.append(similar(path, time))
+    routes_all, weights = par.shortest_routes(timestamp, perc, workers=workers, chunk_size=chunk_size)
+    paths += par.parallel_map(similar, routes_all, timestamp, workers=workers, chunk_size=chunk_size)
 
     return paths
@@ -14,13 +14,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from edge import Edge
 
 
 @dataclass
 class WeightedEdge(Edge):
     weight: float
+    number: int = field(default=-1, compare=False)  # edge number in the graph it came from, -1 if unknown
 
     # so that we can order edges by weight to find the minimum weight edge
     def __lt__(self, other: WeightedEdge) -> bool:
@@ -13,7 +13,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from typing import TypeVar, Generic, List, Tuple, Optional
+from typing import TypeVar, Generic, List, Tuple, Optional, Dict, Iterable, Sequence
 from graph import Graph
 from weighted_edge import WeightedEdge
 
@@ -25,17 +25,39 @@ class WeightedGraph(Generic[V], Graph[V]):
         if vertices is None:
             vertices = []
         self._vertices: List[V] = vertices
+        self._indices: Dict[V, int] = {}  # vertex -> index of its first occurrence
+        for i, vertex in enumerate(vertices):
+            self._indices.setdefault(vertex, i)
         self._edges: List[List[WeightedEdge]] = [[] for _ in vertices]
 
-    def add_edge_by_indices(self, u: int, v: int, weight: float) -> None:
-        edge: WeightedEdge = WeightedEdge(u, v, weight)
+    def add_edge_by_indices(self, u: int, v: int, weight: float, number: int = -1) -> None:
+        edge: WeightedEdge = WeightedEdge(u, v, weight, number)
         self.add_edge(edge) # call superclass version
 
     def add_edge_by_vertices(self, first: V, second: V, weight: float) -> None:
-        u: int = self._vertices.index(first)
-        v: int = self._vertices.index(second)
+        u: int = self.index_of(first)
+        v: int = self.index_of(second)
         self.add_edge_by_indices(u, v, weight)
 
+    # Add many edges at once from (first, second, weight) triples (convenience method)
+    def add_edges_from(self, edges: Iterable[Tuple[V, V, float]]) -> None:
+        for first, second, weight in edges:
+            self.add_edge_by_indices(self.index_of(first), self.index_of(second), weight)
+
+    # Edge number of every edge in adjacency order: the number it was added with, else its adjacency position. These
+    # are the numbers CSRGraph.from_weighted_graph gives the edges
+    def edge_numbers(self) -> List[int]:
+        return [edge.number if edge.number >= 0 else pos
+                for pos, edge in enumerate(edge for edges in self._edges for edge in edges)]
+
+    # Swap in a new weight for every edge, weights[n] for edge number n as in CSRGraph.update_weights. This graph
+    # does not share its edges with a CSRGraph copy of it, so both have to be reweighted
+    def update_weights(self, weights: Sequence[float]) -> None:
+        if len(weights) != self.edge_count:
+            raise ValueError(f"expected {self.edge_count} weights, got {len(weights)}")
+        for edge, number in zip((edge for edges in self._edges for edge in edges), self.edge_numbers()):
+            edge.weight = weights[number]
+
     def neighbors_for_index_with_weights(self, index: int) -> List[Tuple[V, float]]:
         distance_tuples: List[Tuple[V, float]] = []
         for edge in self.edges_for_index(index):